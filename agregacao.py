@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import case, func, select
+
+import colunar
+from metricas import etapa
+from models import db, Resumo
+from paginacao import ParametroInvalido, ler_data
+
+# Regra de reamostragem do pandas e formato do rótulo de cada período
+PERIODOS = {
+    'dia': ('D', '%Y-%m-%d'),
+    'semana': ('W-MON', '%Y-%m-%d'),  # semanas de segunda a domingo, rotuladas pela segunda
+    'mes': ('MS', '%Y-%m'),
+    'ano': ('YS', '%Y'),
+}
+PERIODO_PADRAO = 'mes'
+# Prefixo da data ISO que forma o rótulo nas consultas SQL (a semana é calculada à parte)
+TAMANHOS_CHAVE = {'dia': 10, 'mes': 7, 'ano': 4}
+
+# Textos dos gráficos para cada período
+TITULOS = {'dia': 'Diárias', 'semana': 'Semanais', 'mes': 'Mensais', 'ano': 'Anuais'}
+EIXOS = {'dia': 'Dia', 'semana': 'Semana', 'mes': 'Mês', 'ano': 'Ano'}
+
+SERIES = ('vendas_unidades', 'vendas_total', 'gastos_total')
+
+
+def ler_periodo(valor):
+    if not valor:
+        return PERIODO_PADRAO
+    if valor not in PERIODOS:
+        raise ParametroInvalido(f"'periodo' deve ser um de: {', '.join(PERIODOS)}")
+    return valor
+
+
+def ler_intervalo(argumentos):
+    de = ler_data(argumentos.get('de'), 'de')
+    ate = ler_data(argumentos.get('ate'), 'ate')
+    if de and ate and de > ate:
+        raise ParametroInvalido("'de' deve ser anterior a 'ate'")
+    return de, ate
+
+
+def _nos_resumos_diarios(consulta, de, ate):
+    # Restringe aos resumos diários das duas tabelas, pela chave primária (tabela, periodo, chave)
+    consulta = consulta.where(Resumo.tabela.in_(('venda', 'gasto')), Resumo.periodo == 'dia')
+    if de:
+        consulta = consulta.where(Resumo.chave >= de.isoformat())
+    if ate:
+        consulta = consulta.where(Resumo.chave <= ate.isoformat())
+    return consulta
+
+
+def _colunar():
+    # FONTE_ANALISE = 'colunar': somas diárias dos arquivos Parquet (ver colunar.py) em vez dos resumos
+    return current_app.config['FONTE_ANALISE'] == 'colunar'
+
+
+def _diarios(de, ate):
+    if _colunar():
+        return colunar.diarios(current_app.config['PASTA_COLUNAR'], de, ate)
+    # Lê os resumos diários das duas tabelas numa consulta só (uma linha por dia e tabela)
+    consulta = select(Resumo.tabela, Resumo.chave, Resumo.unidades, Resumo.total_centavos)
+    return db.session.execute(_nos_resumos_diarios(consulta, de, ate)).all()
+
+
+@etapa('agregacao')
+def series(periodo=PERIODO_PADRAO, de=None, ate=None):
+    # Séries alinhadas de vendas e gastos no mesmo eixo de datas, com zeros nos buckets vazios
+    linhas = _diarios(de, ate)
+    if not linhas:
+        return {'periodo': periodo, 'rotulos': [], **{nome: [] for nome in SERIES}}
+
+    # Importado aqui para o pandas só ser carregado quando um dashboard for aberto
+    import pandas as pd
+
+    regra, formato = PERIODOS[periodo]
+    quadro = pd.DataFrame(linhas, columns=['tabela', 'dia', 'unidades', 'total'])
+    quadro['dia'] = pd.to_datetime(quadro['dia'], format='%Y-%m-%d')
+    quadro = quadro.pivot(index='dia', columns='tabela', values=['unidades', 'total'])
+    quadro = quadro.reindex(
+        columns=pd.MultiIndex.from_product([['unidades', 'total'], ['venda', 'gasto']]), fill_value=0
+    ).fillna(0)
+
+    # Um único resample cobre todas as séries; o intervalo pedido define as bordas, limitado aos
+    # dados e a hoje: ?de=0001-01-01 não vira milhões de buckets vazios
+    hoje = pd.Timestamp(date.today())
+    inicio = min(quadro.index.min(), hoje)
+    fim = max(quadro.index.max(), hoje)
+    if de:
+        inicio = max(pd.Timestamp(de), inicio)
+    if ate:
+        fim = min(pd.Timestamp(ate), fim)
+    quadro = quadro.reindex(pd.date_range(inicio, fim, freq='D'), fill_value=0)
+    agregado = quadro.resample(regra, label='left', closed='left').sum()
+
+    return {
+        'periodo': periodo,
+        'rotulos': agregado.index.strftime(formato).tolist(),
+        'vendas_unidades': agregado[('unidades', 'venda')].astype('int64').tolist(),
+        'vendas_total': (agregado[('total', 'venda')] / 100).tolist(),
+        'gastos_total': (agregado[('total', 'gasto')] / 100).tolist(),
+    }
+
+
+def _chave_sql(coluna, periodo):
+    # Mesmo rótulo que series() usa, calculado pelo SQLite sobre a data ISO
+    if periodo == 'semana':
+        return func.date(coluna, '-6 days', 'weekday 1')
+    return func.substr(coluna, 1, TAMANHOS_CHAVE[periodo])
+
+
+def _chave_python(dia, periodo):
+    # Mesmo rótulo de _chave_sql, para as somas diárias que não vêm do SQLite
+    if periodo == 'semana':
+        data = date.fromisoformat(dia)
+        return (data - timedelta(days=data.weekday())).isoformat()
+    return dia[:TAMANHOS_CHAVE[periodo]]
+
+
+@etapa('agregacao_lucro')
+def lucro(periodo=PERIODO_PADRAO, de=None, ate=None):
+    # Receita, gastos e lucro por período numa única consulta sobre os resumos diários
+    # de venda e gasto: o custo depende do número de dias no intervalo, não de lançamentos
+    if _colunar():
+        # Com os arquivos colunares, as mesmas somas são feitas aqui sobre as linhas diárias
+        somas = {}
+        for tabela, dia, _, total in _diarios(de, ate):
+            chave = _chave_python(dia, periodo)
+            receita, gasto = somas.get(chave, (0, 0))
+            somas[chave] = (receita + total, gasto) if tabela == 'venda' else (receita, gasto + total)
+        linhas = [(chave, receita, gasto) for chave, (receita, gasto) in sorted(somas.items())]
+    else:
+        chave = _chave_sql(Resumo.chave, periodo)
+        consulta = select(
+            chave,
+            func.sum(case((Resumo.tabela == 'venda', Resumo.total_centavos), else_=0)),
+            func.sum(case((Resumo.tabela == 'gasto', Resumo.total_centavos), else_=0)),
+        )
+        consulta = _nos_resumos_diarios(consulta, de, ate)
+        linhas = db.session.execute(consulta.group_by(chave).order_by(chave)).all()
+
+    resultado = {'periodo': periodo, 'rotulos': [], 'receita': [], 'gastos': [], 'lucro': []}
+    for chave, receita, gasto in linhas:
+        resultado['rotulos'].append(chave)
+        resultado['receita'].append(receita / 100)
+        resultado['gastos'].append(gasto / 100)
+        resultado['lucro'].append((receita - gasto) / 100)
+    return resultado
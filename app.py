@@ -1,737 +1,518 @@
 import os
-from flask import Flask, render_template_string, request, flash, redirect, url_for, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_wtf import FlaskForm
-from wtforms import StringField, IntegerField, FloatField, DateField, SubmitField
-from wtforms.validators import DataRequired, NumberRange, Length
-import pandas as pd
-import plotly.graph_objects as go
-import threading
-import webbrowser
-
-# Configuração do aplicativo Flask
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'supersecretkey'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sistema.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Inicialização do banco de dados
-db = SQLAlchemy(app)
-
-
-# Modelo para vendas
-class Venda(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    data = db.Column(db.String(10), nullable=False)
-    descricao = db.Column(db.String(100), nullable=False)
-    unidade = db.Column(db.Integer, nullable=False)
-    valor_unitario = db.Column(db.Float, nullable=False)
-
-
-# Modelo para gastos
-class Gasto(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    data = db.Column(db.String(10), nullable=False)
-    descricao = db.Column(db.String(100), nullable=False)
-    valor = db.Column(db.Float, nullable=False)
-
-
-# Formulário para Vendas
-class VendaForm(FlaskForm):
-    data = DateField('Data', validators=[DataRequired()])
-    descricao = StringField('Descrição',
-                            validators=[DataRequired(), Length(min=2, max=100)])
-    unidade = IntegerField('Unidade',
-                           validators=[DataRequired(), NumberRange(min=1)])
-    valor_unitario = FloatField('Valor Unitário',
-                                validators=[DataRequired()])
-    submit = SubmitField('Cadastrar Venda')
-
-
-# Formulário para Gastos
-class GastoForm(FlaskForm):
-    data = DateField('Data', validators=[DataRequired()])
-    descricao = StringField('Descrição', validators=[DataRequired(), Length(min=2, max=100)])
-    valor = FloatField('Valor', validators=[DataRequired()])
-    submit = SubmitField('Cadastrar Gasto')
-
-
-def abrir_navegador():
-    webbrowser.open_new('http://127.0.0.1:5000')
-
-
-@app.route('/', methods=['GET', 'POST'])
+import click
+from flask import (Blueprint, Flask, Response, current_app, render_template, request, flash, redirect,
+                   url_for, jsonify, send_file, stream_with_context)
+from datetime import date
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.wsgi import ClosingIterator
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Venda, Gasto, Tarefa, versoes
+from formularios import VendaForm, GastoForm
+from cache import cache_figuras, cache_resumos
+import agregacao
+import ativos
+import banco
+import busca
+import catalogo
+import colunar
+import escritor
+import eventos
+import exportacao
+import graficos
+import importacao
+import metricas
+import paginacao
+import respostas
+import resumos
+import sincronizacao
+import tarefas
+
+TEMPLATES = ('index.html', 'dashboard_vendas.html', 'dashboard_gastos.html', 'dashboard_lucro.html',
+             'grafico.html')
+
+# Rotas e comandos do sistema; registrados no aplicativo por create_app()
+rotas = Blueprint('chaveiro', __name__, cli_group=None)
+
+
+@rotas.route('/', methods=['GET', 'POST'])
+@respostas.condicional('venda', 'gasto', templates=True)
 def home():
     vendas_form = VendaForm()
     gastos_form = GastoForm()
 
     if vendas_form.validate_on_submit() and 'cadastrar_venda' in request.form:
-        nova_venda = Venda(
-            data=vendas_form.data.data.strftime('%Y-%m-%d'),
+        escritor.gravar(
+            Venda,
+            data=vendas_form.data.data,
             descricao=vendas_form.descricao.data,
             unidade=vendas_form.unidade.data,
-            valor_unitario=vendas_form.valor_unitario.data
+            valor_unitario=vendas_form.valor_unitario.data,
+            produto_id=vendas_form.produto_id.data
         )
-        db.session.add(nova_venda)
-        db.session.commit()
         flash('Venda cadastrada com sucesso!', 'success')
-        return redirect(url_for('home'))
+        return redirect(url_for('.home'))
 
     if gastos_form.validate_on_submit() and 'cadastrar_gasto' in request.form:
-        novo_gasto = Gasto(
-            data=gastos_form.data.data.strftime('%Y-%m-%d'),
+        escritor.gravar(
+            Gasto,
+            data=gastos_form.data.data,
             descricao=gastos_form.descricao.data,
             valor=gastos_form.valor.data
         )
-        db.session.add(novo_gasto)
-        db.session.commit()
         flash('Gasto cadastrado com sucesso!', 'success')
-        return redirect(url_for('home'))
+        return redirect(url_for('.home'))
+
+    vendas, proximo_vendas = paginacao.listar(Venda)
+    gastos, proximo_gastos = paginacao.listar(Gasto)
+
+    return render_template('index.html', vendas=vendas, gastos=gastos,
+                           proximo_vendas=proximo_vendas, proximo_gastos=proximo_gastos,
+                           vendas_form=vendas_form, gastos_form=gastos_form)
+
+
+@rotas.route('/api/vendas')
+@respostas.condicional('venda')
+def api_vendas():
+    return jsonify(paginacao.pagina(Venda, request.args))
+
+
+@rotas.route('/api/gastos')
+@respostas.condicional('gasto')
+def api_gastos():
+    return jsonify(paginacao.pagina(Gasto, request.args))
+
+
+@rotas.route('/api/busca')
+@respostas.condicional('venda', 'gasto')
+def api_busca():
+    tipo = request.args.get('tipo', 'vendas')
+    if tipo not in busca.TIPOS:
+        raise paginacao.ParametroInvalido("'tipo' deve ser vendas ou gastos")
+    return jsonify(busca.pagina(tipo, request.args))
+
+
+@rotas.route('/api/produtos', methods=['POST'])
+def api_produtos():
+    try:
+        return jsonify(catalogo.salvar(request.get_json(silent=True)))
+    except IntegrityError:
+        # O mesmo código cadastrado ao mesmo tempo por outro terminal
+        db.session.rollback()
+        return jsonify({'erro': 'Produto em conflito, tente novamente'}), 409
+
+
+@rotas.route('/api/produtos/sugestao')
+def api_produtos_sugestao():
+    # Consulta só o índice em memória (ver catalogo.py)
+    limite = catalogo.ler_limite_sugestoes(request.args.get('limite'))
+    return jsonify({'itens': catalogo.indice().sugerir(request.args.get('q', ''), limite)})
+
+
+@rotas.route('/api/produtos/ranking')
+@respostas.condicional('venda', 'produto')
+def api_produtos_ranking():
+    de, ate = agregacao.ler_intervalo(request.args)
+    limite = paginacao.ler_limite(request.args.get('limite'))
+    ordem = request.args.get('ordem', 'total')
+    if ordem not in catalogo.ORDENS_RANKING:
+        raise paginacao.ParametroInvalido("'ordem' deve ser total ou unidades")
+    chave = (('venda', 'produto'), 'ranking', versoes(('venda', 'produto')), de, ate, limite, ordem)
+    return jsonify(cache_resumos.obter(chave, lambda: catalogo.ranking(de, ate, limite, ordem)))
+
+
+@rotas.route('/importar/<tipo>', methods=['POST'])
+def importar_arquivo(tipo):
+    if tipo not in importacao.TIPOS:
+        return jsonify({'erro': 'Tipo deve ser vendas ou gastos'}), 404
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({'erro': "Envie o arquivo no campo 'arquivo'"}), 400
+    linhas = importacao.ler_linhas(arquivo.stream, arquivo.filename)
+    return jsonify(importacao.importar(tipo, linhas))
+
+
+@rotas.route('/export/<tipo>')
+def exportar_arquivo(tipo):
+    if tipo not in exportacao.COLUNAS:
+        return jsonify({'erro': 'Tipo deve ser vendas ou gastos'}), 404
+    formato = request.args.get('formato', 'csv')
+    if formato not in exportacao.FORMATOS:
+        raise paginacao.ParametroInvalido("'formato' deve ser csv ou xlsx")
+    if request.args.get('assincrono') == '1':
+        # O arquivo é gerado por uma tarefa; a resposta traz o endereço para acompanhar
+        return resposta_tarefa(*tarefas.criar('exportacao', request.args.to_dict() | {'tipo': tipo}))
+    de, ate = agregacao.ler_intervalo(request.args)
+    conteudo = exportacao.exportar(tipo, formato, de, ate)
+    resposta = Response(stream_with_context(conteudo), mimetype=exportacao.FORMATOS[formato])
+    resposta.headers['Content-Disposition'] = (
+        f'attachment; filename="{exportacao.nome_arquivo(tipo, formato, de, ate)}"')
+    return resposta
+
+
+def tarefa_dict(tarefa):
+    dados = tarefa.como_dict()
+    dados['status'] = url_for('.api_job', tarefa_id=tarefa.id)
+    dados['resultado'] = url_for('.api_job_resultado', tarefa_id=tarefa.id) if tarefa.estado == 'concluida' else None
+    return dados
+
+
+def resposta_tarefa(tarefa, criada):
+    # 202 com o endereço de acompanhamento; uma tarefa igual já existente é devolvida no lugar
+    resposta = jsonify(tarefa_dict(tarefa) | {'criada': criada})
+    resposta.status_code = 202
+    resposta.headers['Location'] = url_for('.api_job', tarefa_id=tarefa.id)
+    return resposta
+
+
+@rotas.route('/api/jobs', methods=['POST'])
+def api_jobs():
+    pedido = request.get_json(silent=True)
+    if not isinstance(pedido, dict):
+        raise paginacao.ParametroInvalido("Envie um objeto JSON com 'tipo' e 'parametros'")
+    return resposta_tarefa(*tarefas.criar(pedido.get('tipo'), pedido.get('parametros')))
+
+
+@rotas.route('/api/jobs/<tarefa_id>')
+def api_job(tarefa_id):
+    tarefa = db.session.get(Tarefa, tarefa_id)
+    if tarefa is None:
+        return jsonify({'erro': 'Tarefa não encontrada'}), 404
+    if tarefa.estado == 'pendente':
+        # Garante um executor vivo neste processo (o que criou a tarefa pode ter reiniciado)
+        current_app.extensions['tarefas'].acordar()
+    return jsonify(tarefa_dict(tarefa))
+
+
+@rotas.route('/api/jobs/<tarefa_id>/resultado')
+def api_job_resultado(tarefa_id):
+    tarefa = db.session.get(Tarefa, tarefa_id)
+    if tarefa is None:
+        return jsonify({'erro': 'Tarefa não encontrada'}), 404
+    if tarefa.estado != 'concluida':
+        return jsonify({'erro': f'Tarefa ainda não concluída ({tarefa.estado})'}), 409
+    caminho = tarefas.caminho(tarefa.id)
+    if not os.path.exists(caminho):
+        return jsonify({'erro': 'Resultado expirado; crie a tarefa de novo'}), 410
+    return send_file(caminho, mimetype=tarefa.mimetype, as_attachment=True,
+                     download_name=tarefa.nome_arquivo, conditional=True)
+
+
+@rotas.route('/api/sync', methods=['POST'])
+def api_sync():
+    try:
+        return jsonify(sincronizacao.sincronizar(request.get_json(silent=True)))
+    except IntegrityError:
+        # Outro terminal gravou a mesma chave ao mesmo tempo; o reenvio será confirmado
+        db.session.rollback()
+        return jsonify({'erro': 'Lote em conflito, tente novamente'}), 409
+
+
+@rotas.app_errorhandler(paginacao.ParametroInvalido)
+@rotas.app_errorhandler(importacao.ArquivoInvalido)
+@rotas.app_errorhandler(sincronizacao.LoteInvalido)
+@rotas.app_errorhandler(catalogo.ProdutoInvalido)
+def parametro_invalido(erro):
+    return jsonify({'erro': str(erro)}), 400
+
+
+@rotas.app_errorhandler(exportacao.ExportacaoIndisponivel)
+@rotas.app_errorhandler(colunar.ColunarIndisponivel)
+def exportacao_indisponivel(erro):
+    return jsonify({'erro': str(erro)}), 501
+
+
+# Tabelas de que cada gráfico depende; a versão delas entra nas chaves de cache e no ETag
+GRAFICOS = {'vendas': ('venda',), 'gastos': ('gasto',), 'lucro': ('venda', 'gasto')}
+MODOS_GRAFICOS = ('servidor', 'cliente')
+
+
+def filtros_dashboard():
+    periodo = agregacao.ler_periodo(request.args.get('periodo'))
+    de, ate = agregacao.ler_intervalo(request.args)
+    return {'periodo': periodo, 'de': de, 'ate': ate}
+
+
+def modo_graficos():
+    # 'servidor': figura do plotly montada aqui; 'cliente': só os dados, desenhados com Chart.js
+    modo = request.args.get('modo') or current_app.config['MODO_GRAFICOS']
+    if modo not in MODOS_GRAFICOS:
+        raise paginacao.ParametroInvalido("'modo' deve ser servidor ou cliente")
+    return modo
+
+
+def chave_grafico(nome, formato, filtros):
+    # A chave inclui a versão dos dados: qualquer gravação nas tabelas gera uma chave nova
+    return (nome, formato, versoes(GRAFICOS[nome]), filtros['periodo'], filtros['de'], filtros['ate'])
 
-    vendas = Venda.query.all()
-    gastos = Gasto.query.all()
 
-    return render_template_string(HOME_HTML, vendas=vendas, gastos=gastos, vendas_form=vendas_form, gastos_form=gastos_form)
+def dados_em_cache(nome, filtros, chave=None):
+    chave = chave or chave_grafico(nome, 'dados', filtros)
+    return cache_figuras.obter(chave, lambda: graficos.dados(nome, **filtros))
 
 
-@app.route('/dashboard_vendas')
-def dashboard_vendas():
-    vendas_df = pd.read_sql_query("SELECT * FROM venda", db.engine)
+def figura_em_cache(nome, filtros):
+    # '' quando não há dados no intervalo
+    def gerar():
+        dados = dados_em_cache(nome, filtros)
+        return graficos.figura(dados) if dados['rotulos'] else ''
+    return cache_figuras.obter(chave_grafico(nome, 'plotly', filtros), gerar)
+
+
+def renderizar_dashboard(nome, mensagem_vazio, **contexto):
+    filtros = filtros_dashboard()
+    modo = modo_graficos()
+    figura = ''
+    if modo == 'servidor':
+        figura = figura_em_cache(nome, filtros)
+        if not figura:
+            flash(mensagem_vazio, "info")
+        else:
+            contexto['plotly_js'] = ativos.nome_plotly()
+    return render_template(f'dashboard_{nome}.html', grafico=nome, tabelas=GRAFICOS[nome], figura=figura,
+                           filtros=filtros, modo=modo, **contexto)
+
 
-    if vendas_df.empty:
-        flash("Nenhum dado de vendas encontrado!", "info")
-        return render_template_string(DASHBOARD_VENDAS_HTML, plot="")
+@rotas.route('/dashboard_vendas')
+@respostas.condicional('venda', templates=True)
+def dashboard_vendas():
+    return renderizar_dashboard('vendas', "Nenhum dado de vendas encontrado!")
 
-    vendas_df['data'] = pd.to_datetime(vendas_df['data'], errors='coerce')
-    vendas_df['mes'] = vendas_df['data'].dt.month
 
-    fig = go.Figure(data=[
-        go.Bar(
-            name='Vendas Mensais',
-            x=vendas_df['mes'].value_counts().sort_index().index,
-            y=vendas_df.groupby('mes')['unidade'].sum(),
-            marker_color='#00b4d8'
-        )
-    ])
-    fig.update_layout(
-        title='Vendas Mensais',
-        xaxis_title='Mês',
-        yaxis_title='Unidades Vendidas',
-        template='plotly_dark'
-    )
-
-    graph_html = fig.to_html(full_html=False)
-    return render_template_string(DASHBOARD_VENDAS_HTML, plot=graph_html)
-
-@app.route('/dashboard_gastos')
+@rotas.route('/dashboard_gastos')
+@respostas.condicional('gasto', templates=True)
 def dashboard_gastos():
-    gastos_df = pd.read_sql_query("SELECT * FROM gasto", db.engine)
+    return renderizar_dashboard('gastos', "Nenhum dado de gastos encontrado!")
+
+
+@rotas.route('/dashboard_lucro')
+@respostas.condicional('venda', 'gasto', templates=True)
+def dashboard_lucro():
+    # Os cartões mostram os totais do intervalo nos dois modos
+    dados = dados_em_cache('lucro', filtros_dashboard())
+    totais = {serie['chave']: sum(serie['valores']) for serie in dados['series']} if dados['rotulos'] else None
+    return renderizar_dashboard('lucro', "Nenhum dado de vendas ou gastos encontrado!", totais=totais)
+
+
+@rotas.route('/api/grafico/<nome>')
+def api_grafico(nome):
+    if nome not in GRAFICOS:
+        return jsonify({'erro': 'Gráfico deve ser vendas, gastos ou lucro'}), 404
+    filtros = filtros_dashboard()
+    chave = chave_grafico(nome, 'dados', filtros)
+    # O ETag sai da chave (versão dos dados + filtros), então um 304 não consulta nada
+    marca = respostas.etag(*chave)
+    if request.if_none_match.contains_weak(marca):
+        resposta = Response(status=304)
+    else:
+        resposta = jsonify(dados_em_cache(nome, filtros, chave))
+    resposta.set_etag(marca, weak=True)
+    resposta.cache_control.no_cache = True
+    return resposta
+
+
+def lucro_em_cache(filtros):
+    tabelas = ('venda', 'gasto')
+    chave = (tabelas, 'lucro', versoes(tabelas), filtros['periodo'], filtros['de'], filtros['ate'])
+    return cache_resumos.obter(chave, lambda: agregacao.lucro(**filtros))
+
+
+@rotas.route('/api/lucro')
+@respostas.condicional('venda', 'gasto')
+def api_lucro():
+    return jsonify(lucro_em_cache(filtros_dashboard()))
+
+
+@rotas.route('/api/resumo_vendas')
+@respostas.condicional('venda', diario=True)
+def api_resumo_vendas():
+    chave = ('venda', 'totais', versoes(('venda',)), date.today())
+    return jsonify(cache_resumos.obter(chave, lambda: resumos.totais('venda')))
+
+
+@rotas.route('/api/resumo_gastos')
+@respostas.condicional('gasto', diario=True)
+def api_resumo_gastos():
+    chave = ('gasto', 'totais', versoes(('gasto',)), date.today())
+    return jsonify(cache_resumos.obter(chave, lambda: resumos.totais('gasto')))
+
+
+@rotas.route('/api/eventos')
+def api_eventos():
+    # Server-Sent Events com os totais e os períodos alterados a cada commit (ver eventos.py)
+    transmissor = current_app.extensions['eventos']
+    fila = transmissor.assinar()
+    if fila is None:
+        return jsonify({'erro': 'Dashboards demais conectados; tente de novo em instantes'}), 503
+    corpo = ClosingIterator(transmissor.transmitir(fila), lambda: transmissor.cancelar(fila))
+    resposta = Response(corpo, mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    # Sem buffer em proxies (nginx), para cada evento chegar na hora
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
+
+@rotas.route('/api/cache')
+def api_cache():
+    return jsonify({'figuras': cache_figuras.estatisticas()})
+
+
+@rotas.route('/metrics')
+def metrics():
+    return Response(metricas.registro.exportar(), mimetype='text/plain; version=0.0.4')
+
+
+@rotas.route('/ativos/<nome>')
+def ativo(nome):
+    if nome != ativos.nome_plotly():
+        return 'Arquivo não encontrado', 404
+    pasta = current_app.config['PASTA_ATIVOS']
+    caminho = ativos.caminho_plotly(pasta)
+    if not os.path.exists(caminho):
+        ativos.preparar_plotly(pasta, com_brotli=False)
+
+    caminho, codificacao = ativos.variante(caminho, request.accept_encodings)
+    resposta = send_file(caminho, mimetype='application/javascript', conditional=True)
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+    resposta.headers['Cache-Control'] = ativos.CACHE_CONTROL
+    resposta.vary.add('Accept-Encoding')
+    return resposta
+
+
+@rotas.cli.command('preparar-ativos')
+def preparar_ativos():
+    caminho = ativos.preparar_plotly(current_app.config['PASTA_ATIVOS'])
+    print(f'Bundle do plotly pronto em {caminho}')
+
+
+@rotas.cli.command('importar')
+@click.argument('tipo', type=click.Choice(list(importacao.TIPOS)))
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--lote', default=importacao.TAMANHO_LOTE, show_default=True,
+              help='Linhas gravadas por transação.')
+def importar(tipo, arquivo, lote):
+    with open(arquivo, 'rb') as entrada:
+        try:
+            relatorio = importacao.importar(tipo, importacao.ler_linhas(entrada, arquivo), lote)
+        except importacao.ArquivoInvalido as erro:
+            raise click.ClickException(str(erro))
+    print(f"{relatorio['inseridas']} de {relatorio['lidas']} linhas importadas em "
+          f"{relatorio['segundos']:.1f}s ({relatorio['linhas_por_segundo']} linhas/s)")
+    for rejeitada in relatorio['detalhes_rejeitadas']:
+        print(f"  linha {rejeitada['linha']}: {'; '.join(rejeitada['erros'])}")
+    if relatorio['rejeitadas'] > len(relatorio['detalhes_rejeitadas']):
+        print(f"  ... {relatorio['rejeitadas']} linhas rejeitadas no total")
+
+
+@rotas.cli.command('exportar')
+@click.argument('tipo', type=click.Choice(list(exportacao.COLUNAS)))
+@click.argument('arquivo', type=click.Path(dir_okay=False, writable=True))
+@click.option('--de', help='Data inicial (AAAA-MM-DD).')
+@click.option('--ate', help='Data final (AAAA-MM-DD).')
+def exportar(tipo, arquivo, de, ate):
+    formato = 'xlsx' if arquivo.lower().endswith('.xlsx') else 'csv'
+    try:
+        de, ate = agregacao.ler_intervalo({'de': de, 'ate': ate})
+        with open(arquivo, 'wb') as saida:
+            for pedaco in exportacao.exportar(tipo, formato, de, ate):
+                saida.write(pedaco)
+    except (paginacao.ParametroInvalido, exportacao.ExportacaoIndisponivel) as erro:
+        raise click.ClickException(str(erro))
+    print(f'{tipo.capitalize()} exportadas em {arquivo}')
+
+
+@rotas.cli.command('atualizar-colunar')
+def atualizar_colunar():
+    pasta = current_app.config['PASTA_COLUNAR']
+    try:
+        relatorio = colunar.atualizar(pasta)
+    except colunar.ColunarIndisponivel as erro:
+        raise click.ClickException(str(erro))
+    for tabela, resultado in relatorio.items():
+        regravados = ', '.join(resultado['regravados']) or 'nenhum'
+        print(f"{tabela}: {resultado['acrescentadas']} linhas acrescentadas, meses regravados: {regravados}")
+    print(f'Arquivos colunares atualizados em {pasta}')
+
+
+@rotas.cli.command('migrar')
+def migrar():
+    aplicadas = banco.migrar(db.engine)
+    for numero, descricao in aplicadas:
+        print(f'Migração {numero} aplicada: {descricao}')
+    print(f'Banco na versão {banco.versao(db.engine)}.')
+
+
+@rotas.cli.command('vincular-produtos')
+def vincular_produtos():
+    total = catalogo.vincular()
+    print(f'{total} vendas ligadas ao catálogo de produtos.')
+
+
+@rotas.cli.command('reconstruir-resumos')
+def reconstruir_resumos():
+    total = resumos.reconstruir()
+    print(f'{total} resumos recalculados.')
+
+
+def compilar_templates(app):
+    # Compila todos os templates uma vez; o ambiente do Jinja os mantém em cache
+    if app.config['CACHE_TEMPLATES']:
+        os.makedirs(app.config['CACHE_TEMPLATES'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['CACHE_TEMPLATES'])
+    for nome in TEMPLATES:
+        app.jinja_env.get_template(nome)
+
+
+def create_app(configuracao=None):
+    # Configuração do aplicativo Flask
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('CHAVEIRO_SECRET_KEY', 'supersecretkey')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('CHAVEIRO_BANCO', 'sqlite:///sistema.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['PASTA_ATIVOS'] = os.path.join(app.static_folder, 'vendor')
+    # Pasta opcional para guardar o bytecode compilado dos templates entre reinícios
+    app.config['CACHE_TEMPLATES'] = os.environ.get('CHAVEIRO_CACHE_TEMPLATES')
+    # Fonte das agregações dos dashboards: 'resumos' (padrão) ou 'colunar' (arquivos Parquet
+    # mantidos por 'flask atualizar-colunar' em PASTA_COLUNAR, com as linhas recentes do SQLite)
+    app.config['FONTE_ANALISE'] = os.environ.get('CHAVEIRO_FONTE_ANALISE', 'resumos')
+    app.config['PASTA_COLUNAR'] = os.environ.get('CHAVEIRO_COLUNAR', os.path.join(app.instance_path, 'colunar'))
+    # Cadastros da página inicial gravados em lote por uma thread (ver escritor.py)
+    app.config['ESCRITA_AGRUPADA'] = os.environ.get('CHAVEIRO_ESCRITA_AGRUPADA', '1') == '1'
+    # Tarefas pesadas fora das requisições (ver tarefas.py): quantas rodam ao mesmo tempo,
+    # somando todos os processos, e onde ficam os arquivos de resultado
+    app.config['TAREFAS_SIMULTANEAS'] = int(os.environ.get('CHAVEIRO_TAREFAS_SIMULTANEAS', '1'))
+    app.config['PASTA_TAREFAS'] = os.environ.get('CHAVEIRO_TAREFAS', os.path.join(app.instance_path, 'tarefas'))
+    # Modo padrão dos gráficos dos dashboards ('servidor' ou 'cliente'); ?modo= escolhe por página
+    app.config['MODO_GRAFICOS'] = os.environ.get('CHAVEIRO_MODO_GRAFICOS', 'servidor')
+    # Dashboards ao vivo (/api/eventos) por processo; cada um ocupa uma thread do servidor, então
+    # o servidor.py usa metade das threads. 0 desliga (worker sync do gunicorn, uma thread só).
+    app.config['CONEXOES_EVENTOS'] = int(os.environ.get('CHAVEIRO_CONEXOES_EVENTOS', '4'))
+    app.config.update(configuracao or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                          banco.opcoes_engine(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    # Inicialização do banco de dados
+    db.init_app(app)
+    metricas.instalar(app)
+    escritor.instalar(app)
+    eventos.instalar(app)
+    catalogo.instalar(app)
+    tarefas.instalar(app)
+    app.register_blueprint(rotas)
+
+    # Criação do banco de dados
+    with app.app_context():
+        banco.configurar(db.engine)
+        banco.preparar(db.engine, db.metadata)
+        resumos.garantir_resumos()
+        # O índice de sugestões de produtos já nasce carregado
+        catalogo.indice().atualizar()
+    compilar_templates(app)
+    respostas.instalar(app, TEMPLATES)
+    return app
 
-    if gastos_df.empty:
-        flash("Nenhum dado de gastos encontrado!", "info")
-        return render_template_string(DASHBOARD_GASTOS_HTML, plot="")
-
-    gastos_df['data'] = pd.to_datetime(gastos_df['data'], errors='coerce')
-    gastos_df['mes'] = gastos_df['data'].dt.month
-
-    fig = go.Figure(data=[
-        go.Bar(
-            name='Gastos Mensais',
-            x=gastos_df['mes'].value_counts().sort_index().index,
-            y=gastos_df.groupby('mes')['valor'].sum(),
-            marker_color='#e63946'
-        )
-    ])
-    fig.update_layout(
-        title='Gastos Mensais',
-        xaxis_title='Mês',
-        yaxis_title='Valor (R$)',
-        template='plotly_dark'
-    )
-
-    graph_html = fig.to_html(full_html=False)
-    return render_template_string(DASHBOARD_GASTOS_HTML, plot=graph_html)
-
-# Criação do banco de dados
-with app.app_context():
-    db.create_all()
-
-# HTML para as páginas de dashboard (DASHBOARD_VENDAS_HTML e DASHBOARD_GASTOS_HTML)
-DASHBOARD_VENDAS_HTML = '''
-<!DOCTYPE html>
-<html lang="pt-br">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Dashboard Vendas</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-    <style>
-        body {
-            background: linear-gradient(135deg, #1a1a2e, #16213e);
-            color: #ffffff;
-            font-family: 'Arial', sans-serif;
-            min-height: 100vh; 
-            display: flex;
-            flex-direction: column;
-            margin: 0;
-        }
-        .navbar {
-            background-color: #0f3460;
-            box-shadow: 0px 2px 12px rgba(0, 0, 0, 0.6);
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            z-index: 999;
-        }
-        .navbar-space {
-            height: 80px;
-        }
-        .navbar-brand {
-            font-weight: bold;
-            font-size: 1.5rem;
-            color: #fff;
-        }
-        .nav-link {
-            color: #e0e1dd;
-            font-weight: bold;
-            margin-right: 15px;
-            transition: color 0.3s;
-        }
-        .nav-link:hover {
-            color: #00b4d8;
-        }
-        .section-title {
-            margin-top: 20px;
-            text-align: center;
-            font-weight: bold;
-            font-size: 1.8rem;
-        }
-        .card {
-            border-radius: 16px;
-            margin-top: 20px;
-            box-shadow: 0px 4px 15px rgba(0, 0, 0, 0.5);
-            color: #e9ecef;
-            transition: transform 0.2s ease-in-out, box-shadow 0.2s;
-        }
-        .card:hover {
-            transform: scale(1.05);
-            box-shadow: 0px 8px 30px rgba(0, 0, 0, 0.7);
-        }
-        .info-card {
-            display: flex;
-            align-items: center;
-            gap: 15px;
-        }
-        .info-icon {
-            font-size: 2rem;
-        }
-        .chart-container {
-            height: 300px;
-        }
-        footer {
-            background-color: #0f3460;
-            padding: 15px;
-            text-align: center;
-            color: #d9d9d9;
-        }
-    </style>
-</head>
-<body>
-    <nav class="navbar navbar-expand-lg">
-        <div class="container-fluid">
-            <a class="navbar-brand" href="{{ url_for('home') }}">Chaveiro Willian Mix</a>
-            <div class="navbar-nav">
-                <a class="nav-link" href="{{ url_for('dashboard_vendas') }}">Dashboard Vendas</a>
-                <a class="nav-link" href="{{ url_for('dashboard_gastos') }}">Dashboard Gastos</a>
-            </div>
-        </div>
-    </nav>
-
-    <div class="navbar-space"></div>
-
-    <div class="container mt-5">
-        <h1 class="section-title">Resumo de Vendas</h1>
-        <div class="row">
-            <div class="col-md-4">
-                <div class="card p-4 bg-primary">
-                    <div class="info-card">
-                        <i class="fas fa-calendar-day info-icon"></i>
-                        <div>
-                            <h5>Total do Dia</h5>
-                            <p id="totalDia">R$ 0,00</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-4">
-                <div class="card p-4 bg-info">
-                    <div class="info-card">
-                        <i class="fas fa-calendar-alt info-icon"></i>
-                        <div>
-                            <h5>Total do Mês</h5>
-                            <p id="totalMes">R$ 0,00</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-4">
-                <div class="card p-4 bg-success">
-                    <div class="info-card">
-                        <i class="fas fa-calendar info-icon"></i>
-                        <div>
-                            <h5>Total do Ano</h5>
-                            <p id="totalAno">R$ 0,00</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <div class="card mt-5">
-            <div class="card-body chart-container">
-                {{ plot|safe }}
-            </div>
-        </div>
-    </div>
-
-    <footer>
-        <p>&copy; 2024 - Sistema Willian Batista Oliveira</p>
-    </footer>
-
-<script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-
-<script>
-    // Função para obter dados do backend e atualizar a página
-    async function fetchSalesData() {
-        try {
-            const response = await fetch('/api/resumo_vendas'); // Faz a requisição para o backend
-            const data = await response.json(); // Converte a resposta para JSON
-
-            // Atualiza os elementos HTML com os dados recebidos
-            document.getElementById('totalDia').innerText = `R$ ${data.total_dia.toFixed(2)}`;
-            document.getElementById('totalMes').innerText = `R$ ${data.total_mes.toFixed(2)}`;
-            document.getElementById('totalAno').innerText = `R$ ${data.total_ano.toFixed(2)}`;
-        } catch (error) {
-            console.error('Erro ao buscar dados de vendas:', error);
-        }
-    }
-
-    // Chama a função ao carregar a página
-    document.addEventListener('DOMContentLoaded', fetchSalesData);
-</script>
-
-    <script>
-        // Função para obter dados do backend e atualizar a página
-        async function fetchSalesData() {
-            try {
-                const response = await fetch('/api/resumo_vendas'); // Faz a requisição para o backend
-                const data = await response.json(); // Converte a resposta para JSON
-
-                // Atualiza os elementos HTML com os dados recebidos
-                document.getElementById('totalDia').innerText = `R$ ${data.total_dia.toFixed(2)}`;
-                document.getElementById('totalMes').innerText = `R$ ${data.total_mes.toFixed(2)}`;
-                document.getElementById('totalAno').innerText = `R$ ${data.total_ano.toFixed(2)}`;
-            } catch (error) {
-                console.error('Erro ao buscar dados de vendas:', error);
-            }
-        }
-
-        // Chama a função ao carregar a página
-        document.addEventListener('DOMContentLoaded', fetchSalesData);
-    </script>
-    </body>
-</html>
-
-'''
-
-DASHBOARD_GASTOS_HTML = '''
-<!DOCTYPE html>
-<html lang="pt-br">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Dashboard Gastos</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-    <style>
-        body {
-            background: linear-gradient(135deg, #1a1a2e, #16213e);
-            color: #ffffff;
-            font-family: 'Arial', sans-serif;
-            min-height: 100vh; 
-            display: flex;
-            flex-direction: column;
-            margin: 0;
-        }
-        .navbar {
-            background-color: #0f3460;
-            box-shadow: 0px 2px 12px rgba(0, 0, 0, 0.6);
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            z-index: 999;
-        }
-        .navbar-space {
-            height: 80px;
-        }
-        .navbar-brand {
-            font-weight: bold;
-            font-size: 1.5rem;
-            color: #fff;
-        }
-        .nav-link {
-            color: #e0e1dd;
-            font-weight: bold;
-            margin-right: 15px;
-            transition: color 0.3s;
-        }
-        .nav-link:hover {
-            color: #00b4d8;
-        }
-        .card {
-            border-radius: 16px;
-            margin-top: 20px;
-            box-shadow: 0px 4px 15px rgba(0, 0, 0, 0.5);
-            color: #e9ecef;
-            transition: transform 0.2s ease-in-out, box-shadow 0.2s;
-        }
-        .card:hover {
-            transform: scale(1.05);
-            box-shadow: 0px 8px 30px rgba(0, 0, 0, 0.7);
-        }
-        .info-card {
-            display: flex;
-            align-items: center;
-            gap: 15px;
-        }
-        .info-icon {
-            font-size: 2rem;
-        }
-        .chart-container {
-            height: 300px;
-        }
-        footer {
-            background-color: #0f3460;
-            padding: 15px;
-            text-align: center;
-            color: #d9d9d9;
-        }
-    </style>
-</head>
-<body>
-    <nav class="navbar navbar-expand-lg">
-        <div class="container-fluid">
-            <a class="navbar-brand" href="{{ url_for('home') }}">Chaveiro Willian Mix</a>
-            <div class="navbar-nav">
-                <a class="nav-link" href="{{ url_for('dashboard_vendas') }}">Dashboard Vendas</a>
-                <a class="nav-link" href="{{ url_for('dashboard_gastos') }}">Dashboard Gastos</a>
-            </div>
-        </div>
-    </nav>
-
-    <div class="navbar-space"></div>
-
-    <div class="container mt-5">
-        <h1 class="text-center mb-5">Resumo de Gastos</h1>
-
-        <div class="row">
-            <div class="col-md-4">
-                <div class="card p-4 bg-danger">
-                    <div class="info-card">
-                        <i class="fas fa-calendar-day info-icon"></i>
-                        <div>
-                            <h5>Gasto do Dia</h5>
-                            <p id="gastoDia">R$ 0,00</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-4">
-                <div class="card p-4 bg-warning">
-                    <div class="info-card">
-                        <i class="fas fa-calendar-alt info-icon"></i>
-                        <div>
-                            <h5>Gasto do Mês</h5>
-                            <p id="gastoMes">R$ 0,00</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            <div class="col-md-4">
-                <div class="card p-4 bg-dark">
-                    <div class="info-card">
-                        <i class="fas fa-calendar info-icon"></i>
-                        <div>
-                            <h5>Gasto do Ano</h5>
-                            <p id="gastoAno">R$ 0,00</p>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <div class="card mt-4">
-            <div class="card-body chart-container">
-                {{ plot|safe }}
-            </div>
-        </div>
-    </div>
-
-    <footer>
-        <p>&copy; 2024 - Sistema Willian Batista Oliveira</p>
-    </footer>
-
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-</body>
-</html>
-
-'''
-
-HOME_HTML = '''
-<!DOCTYPE html>
-<html lang="pt-br">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Sistema de Vendas e Gastos</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css" rel="stylesheet">
-    <style>
-        body {
-            background: linear-gradient(135deg, #1a1a2e, #16213e);
-            color: #ffffff;
-            font-family: 'Arial', sans-serif;
-            min-height: 100vh; 
-            display: flex;
-            flex-direction: column;
-            margin: 0;
-        }
-    
-        .navbar {
-            background-color: #0f3460;
-            box-shadow: 0px 2px 12px rgba(0, 0, 0, 0.6);
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            z-index: 999;
-        }
-
-        .navbar-space {
-            height: 80px;
-        }
-
-        .navbar-brand {
-            font-weight: bold;
-            font-size: 1.5rem;
-            color: #fff;
-        }
-    
-        .nav-link {
-            color: #e0e1dd;
-            font-weight: bold;
-            margin-right: 15px;
-            transition: color 0.3s;
-        }
-    
-        .nav-link:hover {
-            color: #00b4d8;
-        }
-    
-        .card {
-            background: linear-gradient(135deg, #3a0ca3, #4361ee);
-            border-radius: 16px;
-            margin-top: 20px;
-            box-shadow: 0px 4px 15px rgba(0, 0, 0, 0.5);
-            color: #e9ecef;
-            transition: transform 0.2s ease-in-out, box-shadow 0.2s;
-        }
-    
-        .card:hover {
-            transform: scale(1.05);
-            box-shadow: 0px 8px 30px rgba(0, 0, 0, 0.7);
-        }
-    
-        .btn-primary {
-            background-color: #00b4d8;
-            border: none;
-            font-weight: bold;
-            transition: background-color 0.3s, transform 0.4s ease-in-out;
-        }
-    
-        .btn-primary:hover {
-            background-color: #0077b6;
-            transform: scale(1.15);
-        }
-    
-        .list-group-item {
-            background-color: #14213d;
-            color: #e9ecef;
-            transition: background-color 0.3s ease-in-out;
-        }
-    
-        .list-group-item:hover {
-            background-color: #1f4068;
-        }
-    
-        footer {
-            background-color: #0f3460;
-            padding: 15px;
-            text-align: center;
-            color: #d9d9d9;
-            margin-top: auto;
-        }
-    </style>
-</head>
-<body>
-    <nav class="navbar navbar-expand-lg">
-        <div class="container-fluid">
-            <a class="navbar-brand" href="{{ url_for('home') }}">Chaveiro Willian Mix</a>
-            <div class="navbar-nav">
-                <a class="nav-link" href="{{ url_for('dashboard_vendas') }}">Dashboard Vendas</a>
-                <a class="nav-link" href="{{ url_for('dashboard_gastos') }}">Dashboard Gastos</a>
-            </div>
-        </div>
-    </nav>
-    <div class="navbar-space"></div>
-
-    <div class="container mt-5">
-        <h1 class="text-center mb-5">Gestão de Vendas e Gastos</h1>
-
-        <!-- Formulário de Vendas -->
-        <div class="row" id="vendas">
-            <div class="col-md-6">
-                <div class="card p-4">
-                    <h3 class="text-center">Registrar Venda</h3>
-                    <form id="vendaForm" action="/cadastrar_venda" method="POST">
-                        <div class="mb-3">
-                            <label for="dataVenda" class="form-label">Data</label>
-                            <input type="date" class="form-control" id="dataVenda" name="dataVenda" required>
-                        </div>
-                        <div class="mb-3">
-                            <label for="descricaoVenda" class="form-label">Descrição</label>
-                            <input type="text" class="form-control" id="descricaoVenda" name="descricaoVenda" required>
-                        </div>
-                        <div class="mb-3">
-                            <label for="unidadeVenda" class="form-label">Unidade</label>
-                            <input type="number" class="form-control" id="unidadeVenda" name="unidadeVenda" min="1" required>
-                        </div>
-                        <div class="mb-3">
-                            <label for="valorUnitarioVenda" class="form-label">Valor Unitário</label>
-                            <input type="number" step="0.01" class="form-control" id="valorUnitarioVenda" name="valorUnitarioVenda" required>
-                        </div>
-                        <button type="submit" class="btn btn-primary w-100">Cadastrar Venda</button>
-                    </form>
-                </div>
-            </div>
-
-            <!-- Formulário de Gastos -->
-            <div class="col-md-6" id="gastos">
-                <div class="card p-4">
-                    <h3 class="text-center">Registrar Gasto</h3>
-                    <form id="gastoForm" action="/cadastrar_gasto" method="POST">
-                        <div class="mb-3">
-                            <label for="dataGasto" class="form-label">Data</label>
-                            <input type="date" class="form-control" id="dataGasto" name="dataGasto" required>
-                        </div>
-                        <div class="mb-3">
-                            <label for="descricaoGasto" class="form-label">Descrição</label>
-                            <input type="text" class="form-control" id="descricaoGasto" name="descricaoGasto" required>
-                        </div>
-                        <div class="mb-3">
-                            <label for="valorGasto" class="form-label">Valor</label>
-                            <input type="number" step="0.01" class="form-control" id="valorGasto" name="valorGasto" required>
-                        </div>
-                        <button type="submit" class="btn btn-primary w-100">Cadastrar Gasto</button>
-                    </form>
-                </div>
-            </div>
-        </div>
-
-        <div class="navbar-space"></div>
-
-        <div class="card p-3 mt-5">
-            <h3>Vendas Registradas</h3>
-            <ul class="list-group mt-3" id="listaVendas"></ul>
-        </div>
-
-        <div class="navbar-space"></div>
-
-        <div class="card p-3 mt-4">
-            <h3>Gastos Registrados</h3>
-            <ul class="list-group mt-3" id="listaGastos"></ul>
-        </div>
-    </div>
-
-    <div class="navbar-space"></div>
-
-    <footer>
-        <p>&copy; 2024 - Sistema Willian Batista Oliveira | Desenvolvido com HTML, CSS e JS</p>
-    </footer>
-
-    <script>
-        function carregarVendas() {
-            const listaVendas = document.getElementById('listaVendas');
-            listaVendas.innerHTML = '';
-            const vendas = JSON.parse(localStorage.getItem('vendas')) || [];
-            vendas.forEach(venda => {
-                const item = document.createElement('li');
-                item.className = 'list-group-item d-flex justify-content-between align-items-center';
-                item.innerHTML = `${venda.data} - ${venda.descricao} <span class="badge bg-primary">R$ ${venda.valorTotal.toFixed(2)}</span>`;
-                listaVendas.appendChild(item);
-            });
-        }
-
-        function carregarGastos() {
-            const listaGastos = document.getElementById('listaGastos');
-            listaGastos.innerHTML = '';
-            const gastos = JSON.parse(localStorage.getItem('gastos')) || [];
-            gastos.forEach(gasto => {
-                const item = document.createElement('li');
-                item.className = 'list-group-item d-flex justify-content-between align-items-center';
-                item.innerHTML = `${gasto.data} - ${gasto.descricao} <span class="badge bg-danger">R$ ${gasto.valor.toFixed(2)}</span>`;
-                listaGastos.appendChild(item);
-            });
-        }
-
-        document.getElementById('vendaForm').addEventListener('submit', function(e) {
-            e.preventDefault();
-            const data = document.getElementById('dataVenda').value;
-            const descricao = document.getElementById('descricaoVenda').value;
-            const unidade = parseInt(document.getElementById('unidadeVenda').value);
-            const valorUnitario = parseFloat(document.getElementById('valorUnitarioVenda').value);
-            const valorTotal = unidade * valorUnitario;
-            const vendas = JSON.parse(localStorage.getItem('vendas')) || [];
-            vendas.push({ data, descricao, unidade, valorTotal });
-            localStorage.setItem('vendas', JSON.stringify(vendas));
-            carregarVendas();
-            e.target.reset();
-        });
-
-        document.getElementById('gastoForm').addEventListener('submit', function(e) {
-            e.preventDefault();
-            const data = document.getElementById('dataGasto').value;
-            const descricao = document.getElementById('descricaoGasto').value;
-            const valor = parseFloat(document.getElementById('valorGasto').value);
-            const gastos = JSON.parse(localStorage.getItem('gastos')) || [];
-            gastos.push({ data, descricao, valor });
-            localStorage.setItem('gastos', JSON.stringify(gastos));
-            carregarGastos();
-            e.target.reset();
-        });
-
-        window.onload = function() {
-            carregarVendas();
-            carregarGastos();
-        };
-    </script>
-</body>
-</html>
-
-'''
 
 if __name__ == '__main__':
-    threading.Timer(1.5, abrir_navegador).start()
-    app.run(debug=True)
+    import servidor
+    servidor.main(['--modo', 'desktop'])
@@ -0,0 +1,59 @@
+import functools
+import gzip
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele servimos apenas gzip
+    brotli = None
+
+
+# Um ano: o nome do arquivo muda junto com a versão do plotly
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_trava = threading.Lock()
+
+
+@functools.cache
+def nome_plotly():
+    # Importado aqui para o plotly só ser carregado quando um dashboard for aberto
+    import plotly.offline
+    return f'plotly-{plotly.offline.get_plotlyjs_version()}.min.js'
+
+
+def caminho_plotly(pasta):
+    return os.path.join(pasta, nome_plotly())
+
+
+def preparar_plotly(pasta, com_brotli=True):
+    # Grava o bundle do plotly e suas variantes pré-comprimidas, uma única vez
+    caminho = caminho_plotly(pasta)
+    with _trava:
+        os.makedirs(pasta, exist_ok=True)
+        if not os.path.exists(caminho):
+            import plotly.offline
+            conteudo = plotly.offline.get_plotlyjs().encode('utf-8')
+            _gravar(caminho + '.gz', gzip.compress(conteudo, compresslevel=9))
+            _gravar(caminho, conteudo)
+        if com_brotli and brotli is not None and not os.path.exists(caminho + '.br'):
+            with open(caminho, 'rb') as arquivo:
+                _gravar(caminho + '.br', brotli.compress(arquivo.read(), quality=11))
+    return caminho
+
+
+def _gravar(caminho, conteudo):
+    # Escreve em arquivo temporário para nunca servir um bundle pela metade
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def variante(caminho, aceita):
+    # Escolhe o arquivo pré-comprimido conforme o Accept-Encoding do navegador
+    if 'br' in aceita and os.path.exists(caminho + '.br'):
+        return caminho + '.br', 'br'
+    if 'gzip' in aceita and os.path.exists(caminho + '.gz'):
+        return caminho + '.gz', 'gzip'
+    return caminho, None
@@ -0,0 +1,233 @@
+from sqlalchemy import event, inspect
+
+# Aplicados a cada conexão nova do pool
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',  # leitores não bloqueiam o escritor (e vice-versa)
+    'PRAGMA synchronous = NORMAL',  # seguro com WAL; fsync só nos checkpoints
+    'PRAGMA cache_size = -65536',  # 64 MiB de cache de páginas por conexão
+    'PRAGMA mmap_size = 268435456',  # leituras por memória mapeada (256 MiB)
+    'PRAGMA temp_store = MEMORY',
+)
+
+OPCOES_POOL = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    # Espera pela trava de escrita (busy timeout do SQLite), em segundos
+    'connect_args': {'timeout': 30},
+}
+
+
+def opcoes_engine(uri):
+    # Bancos em memória usam um pool de conexão única, sem tamanho configurável
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        return {}
+    return dict(OPCOES_POOL)
+
+
+def aplicar_pragmas(conexao_dbapi, registro=None):
+    cursor = conexao_dbapi.cursor()
+    for pragma in PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def configurar(engine):
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', aplicar_pragmas)
+
+
+def _colunas(conexao, tabela):
+    return {linha[1] for linha in conexao.exec_driver_sql(f'PRAGMA table_info({tabela})')}
+
+
+def _migracao_indices(engine):
+    # Índices de cobertura usados pelos totais e listagens por data
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql('DROP INDEX IF EXISTS ix_venda_data')
+        conexao.exec_driver_sql('DROP INDEX IF EXISTS ix_gasto_data')
+        conexao.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS ix_venda_data_valores ON venda (data, unidade, valor_unitario)')
+        conexao.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS ix_gasto_data_valor ON gasto (data, valor)')
+        conexao.exec_driver_sql('ANALYZE')
+
+
+LOTE_MIGRACAO = 10000
+
+# Datas gravadas como DD/MM/AAAA passam para AAAA-MM-DD, o formato do tipo Date
+_DATA_ISO = ("CASE WHEN data LIKE '__/__/____' "
+             "THEN substr(data, 7, 4) || '-' || substr(data, 4, 2) || '-' || substr(data, 1, 2) "
+             "ELSE data END")
+
+_CONVERSOES = {
+    'venda': ('valor_unitario', ('valor_unitario_centavos', 'valor_total_centavos'),
+              'valor_unitario_centavos = CAST(ROUND(ROUND(valor_unitario * 100, 6)) AS INTEGER), '
+              'valor_total_centavos = unidade * CAST(ROUND(ROUND(valor_unitario * 100, 6)) AS INTEGER)'),
+    'gasto': ('valor', ('valor_centavos',),
+              'valor_centavos = CAST(ROUND(ROUND(valor * 100, 6)) AS INTEGER)'),
+}
+
+
+def _migracao_centavos(engine):
+    # Valores em reais (REAL) viram centavos inteiros. Cada lote de ids é
+    # convertido na sua própria transação, então a migração pode ser
+    # interrompida e retomada sem refazer o que já foi convertido.
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql('DROP INDEX IF EXISTS ix_venda_data_valores')
+        conexao.exec_driver_sql('DROP INDEX IF EXISTS ix_gasto_data_valor')
+        for tabela, (antiga, novas, _) in _CONVERSOES.items():
+            existentes = _colunas(conexao, tabela)
+            if antiga not in existentes:
+                continue
+            for coluna in novas:
+                if coluna not in existentes:
+                    conexao.exec_driver_sql(f'ALTER TABLE {tabela} ADD COLUMN {coluna} INTEGER')
+
+    for tabela, (antiga, novas, atribuicoes) in _CONVERSOES.items():
+        with engine.connect() as conexao:
+            if antiga not in _colunas(conexao, tabela):
+                continue
+            menor, maior = conexao.exec_driver_sql(
+                f'SELECT MIN(id), MAX(id) FROM {tabela} WHERE {novas[0]} IS NULL').one()
+        if menor is None:
+            continue
+        for inicio in range(menor, maior + 1, LOTE_MIGRACAO):
+            with engine.begin() as conexao:
+                conexao.exec_driver_sql(
+                    f'UPDATE {tabela} SET {atribuicoes}, data = {_DATA_ISO} '
+                    f'WHERE id >= ? AND id < ? AND {novas[0]} IS NULL',
+                    (inicio, inicio + LOTE_MIGRACAO)
+                )
+
+    with engine.begin() as conexao:
+        for tabela, (antiga, _, _) in _CONVERSOES.items():
+            if antiga in _colunas(conexao, tabela):
+                conexao.exec_driver_sql(f'ALTER TABLE {tabela} DROP COLUMN {antiga}')
+        conexao.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS ix_venda_data_total ON venda (data, unidade, valor_total_centavos)')
+        conexao.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS ix_gasto_data_valor ON gasto (data, valor_centavos)')
+
+        # Os resumos passam a somar centavos; são recriados a partir das tabelas convertidas
+        if 'total' in _colunas(conexao, 'resumo'):
+            conexao.exec_driver_sql('DROP TABLE resumo')
+            conexao.exec_driver_sql(
+                'CREATE TABLE resumo (tabela VARCHAR(10) NOT NULL, periodo VARCHAR(3) NOT NULL, '
+                'chave VARCHAR(10) NOT NULL, registros INTEGER NOT NULL, unidades INTEGER NOT NULL, '
+                'total_centavos INTEGER NOT NULL, PRIMARY KEY (tabela, periodo, chave))')
+            for periodo, tamanho in (('dia', 10), ('mes', 7)):
+                conexao.exec_driver_sql(
+                    f"INSERT INTO resumo SELECT 'venda', '{periodo}', substr(data, 1, {tamanho}), "
+                    f"count(*), sum(unidade), sum(valor_total_centavos) FROM venda "
+                    f"GROUP BY substr(data, 1, {tamanho})")
+                conexao.exec_driver_sql(
+                    f"INSERT INTO resumo SELECT 'gasto', '{periodo}', substr(data, 1, {tamanho}), "
+                    f"count(*), 0, sum(valor_centavos) FROM gasto "
+                    f"GROUP BY substr(data, 1, {tamanho})")
+        conexao.exec_driver_sql('ANALYZE')
+
+
+def _migracao_alteracao_dados(engine):
+    # Momento da última alteração de cada tabela, usado no Last-Modified das respostas
+    with engine.begin() as conexao:
+        if 'alterado_em' not in _colunas(conexao, 'versao_dados'):
+            conexao.exec_driver_sql('ALTER TABLE versao_dados ADD COLUMN alterado_em DATETIME')
+
+
+# Índice de texto completo das descrições: tabela FTS5 de conteúdo externo (guarda só o
+# índice, o texto continua em venda/gasto), mantida pelos gatilhos em qualquer escrita,
+# inclusive as feitas em lote pela importação e pela sincronização
+TABELAS_BUSCA = ('venda', 'gasto')
+
+
+def _criar_busca(conexao, tabela):
+    indice = f'{tabela}_busca'
+    conexao.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE {indice} USING fts5(descricao, content='{tabela}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+    conexao.exec_driver_sql(
+        f'CREATE TRIGGER {indice}_ai AFTER INSERT ON {tabela} BEGIN '
+        f'INSERT INTO {indice} (rowid, descricao) VALUES (new.id, new.descricao); END')
+    conexao.exec_driver_sql(
+        f'CREATE TRIGGER {indice}_ad AFTER DELETE ON {tabela} BEGIN '
+        f"INSERT INTO {indice} ({indice}, rowid, descricao) VALUES ('delete', old.id, old.descricao); END")
+    conexao.exec_driver_sql(
+        f'CREATE TRIGGER {indice}_au AFTER UPDATE OF descricao ON {tabela} BEGIN '
+        f"INSERT INTO {indice} ({indice}, rowid, descricao) VALUES ('delete', old.id, old.descricao); "
+        f'INSERT INTO {indice} (rowid, descricao) VALUES (new.id, new.descricao); END')
+    # Indexa as linhas que já existem
+    conexao.exec_driver_sql(f"INSERT INTO {indice} ({indice}) VALUES ('rebuild')")
+
+
+def _migracao_busca(engine):
+    with engine.begin() as conexao:
+        existentes = {linha[0] for linha in conexao.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for tabela in TABELAS_BUSCA:
+            if f'{tabela}_busca' not in existentes:
+                _criar_busca(conexao, tabela)
+
+
+def _migracao_produtos(engine):
+    # A tabela produto já sai do metadata (create_all); aqui entram a ligação opcional de cada
+    # venda ao produto e o índice de cobertura usado pelos rankings por produto
+    with engine.begin() as conexao:
+        if 'produto_id' not in _colunas(conexao, 'venda'):
+            conexao.exec_driver_sql('ALTER TABLE venda ADD COLUMN produto_id INTEGER REFERENCES produto (id)')
+        conexao.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS ix_venda_produto '
+            'ON venda (produto_id, data, unidade, valor_total_centavos)')
+        conexao.exec_driver_sql('ANALYZE')
+
+
+def _migracao_descricao(engine):
+    # Índices NOCASE para o filtro por prefixo da descrição nas listagens (ver paginacao.py)
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_venda_descricao ON venda (descricao COLLATE NOCASE)')
+        conexao.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_gasto_descricao ON gasto (descricao COLLATE NOCASE)')
+        conexao.exec_driver_sql('ANALYZE')
+
+
+# Migrações em ordem; a versão aplicada fica em PRAGMA user_version do próprio arquivo
+MIGRACOES = [
+    (1, 'índices por data em venda e gasto', _migracao_indices),
+    (2, 'datas como Date e valores em centavos inteiros', _migracao_centavos),
+    (3, 'momento da última alteração em versao_dados', _migracao_alteracao_dados),
+    (4, 'busca de texto completo nas descrições (FTS5)', _migracao_busca),
+    (5, 'catálogo de produtos ligado às vendas', _migracao_produtos),
+    (6, 'índices por prefixo da descrição', _migracao_descricao),
+]
+
+
+def versao(engine):
+    with engine.connect() as conexao:
+        return conexao.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def _carimbar(engine, numero):
+    with engine.begin() as conexao:
+        conexao.exec_driver_sql(f'PRAGMA user_version = {numero}')
+
+
+def migrar(engine):
+    aplicadas = []
+    atual = versao(engine)
+    for numero, descricao, funcao in MIGRACOES:
+        if numero <= atual:
+            continue
+        funcao(engine)
+        _carimbar(engine, numero)
+        aplicadas.append((numero, descricao))
+    return aplicadas
+
+
+def preparar(engine, metadata):
+    # Bancos novos já nascem com o esquema atual; os existentes passam pelas migrações
+    novo = not inspect(engine).has_table('venda')
+    metadata.create_all(engine)
+    if novo:
+        # O índice FTS5 e seus gatilhos ficam fora do metadata do SQLAlchemy
+        _migracao_busca(engine)
+        _carimbar(engine, MIGRACOES[-1][0])
+        return []
+    return migrar(engine)
@@ -0,0 +1,58 @@
+"""Compara a agregação dos dashboards antes e depois do módulo agregacao.
+
+"antes": como o app fazia, lê a tabela venda inteira num DataFrame e agrupa por
+`dt.month` (misturando anos diferentes no mesmo mês).
+"depois": agregacao.series(), um resample sobre os resumos diários das duas
+tabelas, com as séries de vendas e gastos alinhadas.
+
+Uso: python benchmarks/bench_agregacao.py [linhas] [anos] [repeticoes]
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import agregacao  # noqa: E402
+from app import create_app  # noqa: E402
+from importacao import gravar  # noqa: E402
+from models import db, Venda, Gasto  # noqa: E402
+
+
+def antes():
+    vendas_df = pd.read_sql_query('SELECT * FROM venda', db.engine)
+    vendas_df['data'] = pd.to_datetime(vendas_df['data'], errors='coerce')
+    vendas_df['mes'] = vendas_df['data'].dt.month
+    return vendas_df['mes'].value_counts().sort_index().index, vendas_df.groupby('mes')['unidade'].sum()
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    linhas, anos, repeticoes = argumentos + [200000, 5, 20][len(argumentos):]
+    dias = anos * 365
+    inicio = date.today() - timedelta(days=dias)
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "agregacao.db")}'})
+        with app.app_context():
+            gravar(Venda, [{'data': inicio + timedelta(days=random.randrange(dias)), 'descricao': 'Cópia',
+                            'unidade': random.randint(1, 5), 'valor_unitario': 7.5} for _ in range(linhas)])
+            gravar(Gasto, [{'data': inicio + timedelta(days=random.randrange(dias)), 'descricao': 'Fornecedor',
+                            'valor': 120.0} for _ in range(linhas // 5)])
+
+            print(f'{linhas} vendas em {anos} anos, média de {repeticoes} execuções')
+            print(f'{"consulta":<28}{"ms":>10}{"pontos":>9}')
+            tempo = timeit.timeit(antes, number=repeticoes) / repeticoes * 1000
+            print(f'{"antes (dt.month)":<28}{tempo:>10.1f}{len(antes()[0]):>9}')
+            for periodo in agregacao.PERIODOS:
+                tempo = timeit.timeit(lambda: agregacao.series(periodo), number=repeticoes) / repeticoes * 1000
+                pontos = len(agregacao.series(periodo)['rotulos'])
+                print(f'{"depois (" + periodo + ")":<28}{tempo:>10.1f}{pontos:>9}')
+
+
+if __name__ == '__main__':
+    main()
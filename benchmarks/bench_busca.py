@@ -0,0 +1,68 @@
+"""Busca nas descrições: LIKE '%termo%' contra o índice FTS5.
+
+Os dados vêm de gerar_dados.py (poucas descrições, repetidas em muitas linhas), mais
+uma venda em cada mil com uma descrição rara, para medir também buscas seletivas.
+Cada busca pede uma página de 20 resultados.
+
+Uso: python benchmarks/bench_busca.py [vendas] [repeticoes]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import busca  # noqa: E402
+from app import create_app  # noqa: E402
+from gerar_dados import gerar  # noqa: E402
+from importacao import gravar  # noqa: E402
+from models import db, Venda  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+BUSCAS = ('tetra', 'copia chave', 'automotiva', 'condominio', 'inexistente')
+
+
+def mediana(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+
+def com_like(texto):
+    consulta = select(Venda).order_by(Venda.data.desc(), Venda.id.desc()).limit(20)
+    for termo in texto.split():
+        consulta = consulta.where(Venda.descricao.like(f'%{termo}%'))
+    return db.session.scalars(consulta).all()
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    vendas, repeticoes = argumentos + [200000, 10][len(argumentos):]
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "busca.db")}'})
+        with app.app_context():
+            gerar(vendas)
+            gravar(Venda, [{'data': date.today(), 'descricao': f'Controle portão condomínio bloco {numero}',
+                            'unidade': 1, 'valor_unitario': 60} for numero in range(vendas // 1000)])
+
+            print(f'{vendas} vendas, mediana de {repeticoes} buscas (ms)')
+            print(f'{"busca":<16}{"LIKE":>10}{"relevância":>12}{"recentes":>10}{"achadas":>10}')
+            for texto in BUSCAS:
+                termos = busca.expressao(texto)
+                like = mediana(lambda: com_like(texto), repeticoes)
+                relevancia = mediana(lambda: busca.buscar(Venda, termos, 20), repeticoes)
+                recentes = mediana(lambda: busca.buscar(Venda, termos, 20, ordem='recentes'), repeticoes)
+                achadas = db.session.execute(
+                    db.text('SELECT count(*) FROM venda_busca WHERE venda_busca MATCH :termos'),
+                    {'termos': termos}).scalar()
+                print(f'{texto:<16}{like:>10.1f}{relevancia:>12.1f}{recentes:>10.1f}{achadas:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Teste de carga: requisições por segundo de `/` e dos dashboards por número de workers.
+
+Sobe `servidor.py --modo producao` num banco temporário com dados de exemplo,
+dispara clientes HTTP concorrentes (processos separados, com keep-alive) por
+alguns segundos em cada rota e repete para cada quantidade de workers.
+
+Uso: python benchmarks/bench_carga.py [linhas] [segundos] [clientes] [threads]
+"""
+import http.client
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ROTAS = ('/', '/dashboard_vendas', '/dashboard_gastos')
+WORKERS = (1, 2, 4)
+PORTA = 8765
+
+
+def popular(uri, linhas):
+    from app import create_app
+    from importacao import gravar
+    from models import Venda, Gasto
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+    inicio = date.today() - timedelta(days=730)
+    with app.app_context():
+        gravar(Venda, [{'data': inicio + timedelta(days=random.randrange(730)),
+                        'descricao': random.choice(['Cópia de chave', 'Chave tetra', 'Controle']),
+                        'unidade': random.randint(1, 5),
+                        'valor_unitario': random.choice([7.5, 15.0, 35.0])} for _ in range(linhas)])
+        gravar(Gasto, [{'data': inicio + timedelta(days=random.randrange(730)),
+                        'descricao': random.choice(['Fornecedor', 'Energia', 'Aluguel']),
+                        'valor': random.choice([50.0, 120.0, 900.0])} for _ in range(linhas // 5)])
+
+
+def aguardar(porta, limite=30):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+            conexao.request('GET', '/')
+            conexao.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('o servidor não respondeu a tempo')
+
+
+def cliente(porta, rota, segundos):
+    conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+    respostas = erros = 0
+    fim = time.monotonic() + segundos
+    while time.monotonic() < fim:
+        try:
+            conexao.request('GET', rota)
+            resposta = conexao.getresponse()
+            resposta.read()
+            if resposta.status == 200:
+                respostas += 1
+            else:
+                erros += 1
+        except (OSError, http.client.HTTPException):
+            erros += 1
+            conexao.close()
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+    return respostas, erros
+
+
+def medir(porta, rota, clientes, segundos):
+    with ProcessPoolExecutor(clientes) as executor:
+        resultados = list(executor.map(cliente, [porta] * clientes, [rota] * clientes,
+                                       [segundos] * clientes))
+    return sum(r for r, _ in resultados) / segundos, sum(e for _, e in resultados)
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    linhas, segundos, clientes, threads = argumentos + [5000, 5, 16, 8][len(argumentos):]
+    with tempfile.TemporaryDirectory() as pasta:
+        uri = f'sqlite:///{os.path.join(pasta, "carga.db")}'
+        popular(uri, linhas)
+        print(f'{linhas} vendas, {clientes} clientes, {threads} threads por worker, {segundos}s por rota')
+        print(f'{"workers":<9}' + ''.join(f'{rota:>20}' for rota in ROTAS) + '   (req/s)')
+        for workers in WORKERS:
+            processo = subprocess.Popen(
+                [sys.executable, 'servidor.py', '--modo', 'producao', '--host', '127.0.0.1',
+                 '--porta', str(PORTA), '--workers', str(workers), '--threads', str(threads)],
+                # O modo produção exige uma chave secreta; a do benchmark é descartável
+                cwd=RAIZ, env=dict(os.environ, CHAVEIRO_BANCO=uri, CHAVEIRO_SECRET_KEY=secrets.token_hex()),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                aguardar(PORTA)
+                linha = f'{workers:<9}'
+                for rota in ROTAS:
+                    vazao, erros = medir(PORTA, rota, clientes, segundos)
+                    linha += f'{vazao:>20.0f}' if not erros else f'{f"{vazao:.0f} ({erros} erros)":>20}'
+                print(linha)
+            finally:
+                processo.terminate()
+                processo.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Sugestões do catálogo de produtos e ranking de vendas por produto.
+
+Mede a consulta ao índice de prefixos em memória (catalogo.py) com um catálogo de
+vários tamanhos, comparada a um LIKE no banco, e o ranking por produto_id contra o
+mesmo agrupamento feito pela descrição das vendas.
+
+Uso: python benchmarks/bench_catalogo.py [vendas] [produtos]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalogo  # noqa: E402
+from app import create_app  # noqa: E402
+from gerar_dados import gerar  # noqa: E402
+from models import db, Produto, Venda  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+PREFIXOS = ('c', 'co', 'cop', 'chave', 'yale 1', 'p12', 'fechadura t', 'xyz')
+MARCAS = ('Yale', 'Papaiz', 'Pado', 'Soprano', 'Stam', 'Gold', 'Aliança', 'Imab')
+TIPOS = ('Cópia de chave', 'Chave tetra', 'Cadeado', 'Fechadura', 'Controle', 'Chave codificada')
+
+
+def mediana_us(funcao, repeticoes=2000):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1e6
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    vendas, produtos = argumentos + [200000, 5000][len(argumentos):]
+    sorteio = random.Random(7)
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "catalogo.db")}'})
+        with app.test_request_context():
+            gerar(vendas)
+            descricoes = [descricao for descricao, in db.session.execute(select(Venda.descricao).distinct())]
+            catalogo.salvar([{'codigo': f'D{numero}', 'nome': descricao, 'preco': 10}
+                             for numero, descricao in enumerate(descricoes)])
+            for inicio in range(0, produtos, catalogo.MAXIMO_PRODUTOS):
+                catalogo.salvar([{'codigo': f'P{numero}', 'preco': sorteio.randint(5, 300),
+                                  'nome': f'{sorteio.choice(TIPOS)} {sorteio.choice(MARCAS)} {numero}'}
+                                 for numero in range(inicio, min(inicio + catalogo.MAXIMO_PRODUTOS, produtos))])
+            indice = catalogo.indice()
+            inicio = time.perf_counter()
+            indice.invalidar()
+            indice.atualizar()
+            total = db.session.scalar(select(func.count()).select_from(Produto))
+            print(f'{total} produtos: índice carregado em {(time.perf_counter() - inicio) * 1000:.0f} ms')
+
+            print(f'{"prefixo":<14}{"índice (µs)":>12}{"LIKE (µs)":>12}')
+            for prefixo in PREFIXOS:
+                memoria = mediana_us(lambda: indice.sugerir(prefixo))
+                banco = mediana_us(lambda: db.session.execute(
+                    select(Produto).where(Produto.nome.like(f'%{prefixo}%')).limit(catalogo.SUGESTOES_PADRAO)
+                ).all(), repeticoes=50)
+                print(f'{prefixo:<14}{memoria:>12.1f}{banco:>12.0f}')
+
+            inicio = time.perf_counter()
+            ligadas = catalogo.vincular()
+            print(f'{ligadas} vendas ligadas aos produtos em {time.perf_counter() - inicio:.1f}s')
+            por_produto = mediana_us(lambda: catalogo.ranking(limite=20), repeticoes=10) / 1000
+            por_descricao = mediana_us(lambda: db.session.execute(
+                select(Venda.descricao, func.sum(Venda.valor_total_centavos))
+                .group_by(Venda.descricao).order_by(func.sum(Venda.valor_total_centavos).desc()).limit(20)
+            ).all(), repeticoes=10) / 1000
+            print(f'ranking por produto_id: {por_produto:.1f} ms; por descrição: {por_descricao:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Agregações dos dashboards lidas dos resumos e dos arquivos colunares (Parquet).
+
+Mede a primeira cópia completa, uma atualização incremental depois de novas vendas e
+o tempo de series() + lucro() em cada fonte, por período. Precisa do pyarrow; com o
+duckdb instalado, a leitura dos arquivos passa por ele.
+
+Uso: python benchmarks/bench_colunar.py [vendas] [repeticoes]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import agregacao  # noqa: E402
+import colunar  # noqa: E402
+from app import create_app  # noqa: E402
+from gerar_dados import gerar  # noqa: E402
+from importacao import gravar  # noqa: E402
+from models import Venda  # noqa: E402
+
+
+def mediana(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    vendas, repeticoes = argumentos + [1000000, 10][len(argumentos):]
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "colunar.db")}',
+                          'PASTA_COLUNAR': os.path.join(pasta, 'colunar')})
+        with app.app_context():
+            gerar(vendas)
+            inicio = time.perf_counter()
+            colunar.atualizar(app.config['PASTA_COLUNAR'])
+            print(f'{vendas} vendas: cópia completa em {time.perf_counter() - inicio:.1f}s')
+
+            gravar(Venda, [{'data': date.today(), 'descricao': 'Cópia de chave simples', 'unidade': 1,
+                            'valor_unitario': 10} for _ in range(1000)])
+            inicio = time.perf_counter()
+            colunar.atualizar(app.config['PASTA_COLUNAR'])
+            print(f'1000 vendas novas: atualização em {(time.perf_counter() - inicio) * 1000:.0f} ms')
+
+            print(f'{"período":<10}{"resumos (ms)":>14}{"colunar (ms)":>14}')
+            for periodo in agregacao.PERIODOS:
+                medidas = []
+                for fonte in ('resumos', 'colunar'):
+                    app.config['FONTE_ANALISE'] = fonte
+                    medidas.append(mediana(lambda: (agregacao.series(periodo), agregacao.lucro(periodo)),
+                                           repeticoes))
+                print(f'{periodo:<10}{medidas[0]:>14.1f}{medidas[1]:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Cadastros por segundo com vários terminais gravando ao mesmo tempo.
+
+Cada cliente é uma thread que envia o formulário de venda da página inicial em laço,
+como um terminal do balcão. Compara a gravação na própria requisição (um commit por
+venda) com o escritor único (escritor.py), que agrupa os cadastros em lotes.
+
+Uso: python benchmarks/bench_escrita.py [segundos] [clientes]
+     python benchmarks/bench_escrita.py 5 1,8,32
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, Venda  # noqa: E402
+
+FORMULARIO = {'cadastrar_venda': '1', 'data': date.today().isoformat(), 'descricao': 'Cópia de chave simples',
+              'unidade': '1', 'valor_unitario': '10'}
+
+
+def cliente(app, fim, latencias, erros):
+    cliente = app.test_client()
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        resposta = cliente.post('/', data=FORMULARIO)
+        if resposta.status_code == 302:
+            latencias.append(time.perf_counter() - inicio)
+        else:
+            erros.append(resposta.status_code)
+
+
+def medir(pasta, agrupada, clientes, segundos):
+    caminho = os.path.join(pasta, f'escrita_{agrupada}_{clientes}.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'WTF_CSRF_ENABLED': False,
+                      'ESCRITA_AGRUPADA': agrupada})
+    latencias, erros = [], []
+    fim = time.perf_counter() + segundos
+    threads = [threading.Thread(target=cliente, args=(app, fim, latencias, erros)) for _ in range(clientes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        gravadas = db.session.query(Venda).count()
+        db.engine.dispose()
+    escritor = app.extensions.get('escritor')
+    media_lote = escritor.gravados / escritor.lotes if escritor and escritor.lotes else 1
+    latencias.sort()
+    return {
+        'por_segundo': gravadas / segundos,
+        'p50': statistics.median(latencias) * 1000 if latencias else 0,
+        'p95': latencias[int(len(latencias) * 0.95)] * 1000 if latencias else 0,
+        'lote': media_lote,
+        'erros': len(erros),
+    }
+
+
+def main():
+    segundos = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    clientes = [int(valor) for valor in (sys.argv[2] if len(sys.argv) > 2 else '1,8,32').split(',')]
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f'{"modo":<12}{"clientes":>9}{"vendas/s":>10}{"p50 ms":>9}{"p95 ms":>9}{"lote":>7}{"erros":>7}')
+        for quantidade in clientes:
+            for agrupada in (False, True):
+                medida = medir(pasta, agrupada, quantidade, segundos)
+                modo = 'agrupada' if agrupada else 'direta'
+                print(f'{modo:<12}{quantidade:>9}{medida["por_segundo"]:>10.0f}{medida["p50"]:>9.1f}'
+                      f'{medida["p95"]:>9.1f}{medida["lote"]:>7.1f}{medida["erros"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Tempo de resposta dos dashboards com e sem o cache de figuras.
+
+"sem cache": cada requisição grava um gasto e uma venda antes, então a versão dos
+dados muda e a figura é montada de novo (agregação + plotly + to_json).
+"com cache": requisições repetidas sem gravações, servidas do cache_figuras.
+
+Uso: python benchmarks/bench_figuras.py [linhas] [repeticoes]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from cache import cache_figuras  # noqa: E402
+from importacao import gravar  # noqa: E402
+from models import db, Venda, Gasto  # noqa: E402
+
+ROTAS = ('/dashboard_vendas', '/dashboard_gastos', '/dashboard_lucro', '/dashboard_vendas?periodo=dia')
+
+
+def medir(cliente, app, rota, repeticoes, alterar):
+    tempos = []
+    for _ in range(repeticoes):
+        if alterar:
+            with app.app_context():
+                db.session.add(Venda(data=date.today(), descricao='Cópia', unidade=1, valor_unitario=7.5))
+                db.session.add(Gasto(data=date.today(), descricao='Fornecedor', valor=10))
+                db.session.commit()
+        inicio = time.perf_counter()
+        cliente.get(rota)
+        tempos.append(time.perf_counter() - inicio)
+    return sorted(tempos)[len(tempos) // 2] * 1000
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    linhas, repeticoes = argumentos + [100000, 20][len(argumentos):]
+    inicio = date.today() - timedelta(days=5 * 365)
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "figuras.db")}'})
+        with app.app_context():
+            gravar(Venda, [{'data': inicio + timedelta(days=random.randrange(5 * 365)), 'descricao': 'Cópia',
+                            'unidade': random.randint(1, 5), 'valor_unitario': 7.5} for _ in range(linhas)])
+            gravar(Gasto, [{'data': inicio + timedelta(days=random.randrange(5 * 365)), 'descricao': 'Fornecedor',
+                            'valor': 120.0} for _ in range(linhas // 5)])
+        cliente = app.test_client()
+        for rota in ROTAS:
+            cliente.get(rota)
+
+        print(f'{linhas} vendas, mediana de {repeticoes} requisições')
+        print(f'{"rota":<32}{"sem cache (ms)":>16}{"com cache (ms)":>16}')
+        for rota in ROTAS:
+            sem_cache = medir(cliente, app, rota, repeticoes, alterar=True)
+            com_cache = medir(cliente, app, rota, repeticoes, alterar=False)
+            print(f'{rota:<32}{sem_cache:>16.1f}{com_cache:>16.1f}')
+        print('cache_figuras:', cache_figuras.estatisticas())
+
+
+if __name__ == '__main__':
+    main()
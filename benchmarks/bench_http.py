@@ -0,0 +1,62 @@
+"""Custo de uma requisição repetida com e sem GET condicional, e bytes com e sem gzip.
+
+"completa": requisição sem If-None-Match, com os caches em memória já preenchidos.
+"304": o navegador reenvia o ETag recebido e nada mudou desde então.
+
+Uso: python benchmarks/bench_http.py [vendas] [repeticoes]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from gerar_dados import gerar  # noqa: E402
+
+ROTAS = (
+    '/',
+    '/dashboard_vendas',
+    '/dashboard_lucro',
+    '/dashboard_vendas?modo=cliente',
+    '/api/vendas?limite=100',
+    '/api/resumo_vendas',
+    '/api/lucro?periodo=dia',
+)
+
+
+def medir(cliente, rota, repeticoes, cabecalhos):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = cliente.get(rota, headers=cabecalhos)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000, resposta
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    vendas, repeticoes = argumentos + [100000, 50][len(argumentos):]
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "http.db")}'})
+        with app.app_context():
+            gerar(vendas)
+        cliente = app.test_client()
+
+        print(f'{vendas} vendas, mediana de {repeticoes} requisições')
+        print(f'{"rota":<32}{"completa (ms)":>15}{"304 (ms)":>10}{"bytes":>9}{"gzip":>8}')
+        for rota in ROTAS:
+            completa, resposta = medir(cliente, rota, repeticoes, {})
+            etag = resposta.headers['ETag']
+            condicional, resposta_304 = medir(cliente, rota, repeticoes, {'If-None-Match': etag})
+            if resposta_304.status_code != 304:
+                raise RuntimeError(f'{rota} respondeu {resposta_304.status_code} ao If-None-Match')
+            comprimida = cliente.get(rota, headers={'Accept-Encoding': 'gzip'})
+            print(f'{rota:<32}{completa:>15.1f}{condicional:>10.1f}{len(resposta.data):>9}'
+                  f'{len(comprimida.data):>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Tempo de inicialização: `import wsgi` (app criado) e primeira resposta de `/` em processo novo.
+
+Cada rodada sobe um interpretador limpo com um banco temporário e informa
+também quais dependências pesadas já estavam carregadas depois de `/`.
+
+Uso: python benchmarks/bench_inicializacao.py [rodadas]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEDICAO = '''
+import json, sys, time
+inicio = time.perf_counter()
+import wsgi
+importado = time.perf_counter()
+cliente = wsgi.app.test_client()
+cliente.get('/')
+respondido = time.perf_counter()
+pesados = [nome for nome in ('plotly', 'pandas', 'openpyxl', 'numpy') if nome in sys.modules]
+with wsgi.app.app_context():
+    from datetime import date
+    from models import db, Venda
+    db.session.add(Venda(data=date.today(), descricao='Cópia', unidade=1, valor_unitario=10))
+    db.session.commit()
+antes_dashboard = time.perf_counter()
+cliente.get('/dashboard_vendas')
+dashboard = time.perf_counter()
+print(json.dumps({
+    'import': importado - inicio,
+    'primeira': respondido - importado,
+    'dashboard': dashboard - antes_dashboard,
+    'pesados': pesados,
+}))
+'''
+
+
+def rodada(pasta, numero):
+    ambiente = dict(os.environ, CHAVEIRO_BANCO=f'sqlite:///{os.path.join(pasta, f"{numero}.db")}')
+    saida = subprocess.run([sys.executable, '-c', MEDICAO], cwd=RAIZ, env=ambiente,
+                           capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    rodadas = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as pasta:
+        resultados = [rodada(pasta, numero) for numero in range(rodadas)]
+    for chave, rotulo in (('import', 'import wsgi'), ('primeira', 'primeira resposta de /'),
+                          ('dashboard', 'primeiro /dashboard_vendas')):
+        valores = [resultado[chave] * 1000 for resultado in resultados]
+        print(f'{rotulo:<28} mediana {statistics.median(valores):7.1f} ms'
+              f'  (mín {min(valores):.1f}, máx {max(valores):.1f})')
+    print('carregados após /:', ', '.join(resultados[-1]['pesados']) or 'nenhum')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Latência e pico de memória das rotas principais por tamanho de base.
+
+Para cada tamanho gera (ou reaproveita) um banco com gerar_dados.py e mede com o
+test client do Flask:
+- "frio": caches de figuras e resumos esvaziados antes de cada requisição;
+- "quente": requisições repetidas com os caches já preenchidos;
+- pico de memória (tracemalloc) de uma requisição fria.
+
+Com um terceiro argumento, os resultados são gravados em JSON; se o arquivo já
+existir, cada linha mostra a variação da mediana fria em relação a ele.
+
+Os bancos ficam num diretório temporário, ou em CHAVEIRO_BENCH_DADOS para serem
+reaproveitados entre execuções (gerar 10 milhões de vendas leva alguns minutos).
+
+Uso: python benchmarks/bench_rotas.py [tamanhos] [repeticoes] [resultado.json]
+     python benchmarks/bench_rotas.py 10000,1000000,10000000 20 base.json
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from cache import cache_figuras, cache_resumos  # noqa: E402
+from gerar_dados import gerar  # noqa: E402
+
+ROTAS = (
+    '/',
+    '/api/vendas?limite=100',
+    '/api/resumo_vendas',
+    '/dashboard_vendas',
+    '/dashboard_gastos',
+    '/dashboard_lucro',
+    '/dashboard_vendas?periodo=dia',
+)
+
+
+def limpar_caches():
+    cache_figuras.limpar()
+    cache_resumos.invalidar()
+
+
+def requisicao(cliente, rota, frio):
+    if frio:
+        limpar_caches()
+    inicio = time.perf_counter()
+    resposta = cliente.get(rota)
+    duracao = time.perf_counter() - inicio
+    if resposta.status_code != 200:
+        raise RuntimeError(f'{rota} respondeu {resposta.status_code}')
+    return duracao * 1000
+
+
+def pico_memoria(cliente, rota):
+    limpar_caches()
+    tracemalloc.start()
+    try:
+        cliente.get(rota)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def percentil(valores, fracao):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fracao))]
+
+
+def medir(tamanho, pasta, repeticoes):
+    caminho = os.path.join(pasta, f'bench_{tamanho}.db')
+    novo = not os.path.exists(caminho)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}'})
+    if novo:
+        inicio = time.perf_counter()
+        with app.app_context():
+            gerar(tamanho)
+        print(f'  base de {tamanho} vendas gerada em {time.perf_counter() - inicio:.1f}s')
+    cliente = app.test_client()
+
+    resultados = {}
+    for rota in ROTAS:
+        requisicao(cliente, rota, frio=True)
+        frio = [requisicao(cliente, rota, frio=True) for _ in range(repeticoes)]
+        quente = [requisicao(cliente, rota, frio=False) for _ in range(repeticoes)]
+        resultados[rota] = {
+            'frio_p50': statistics.median(frio),
+            'frio_p95': percentil(frio, 0.95),
+            'quente_p50': statistics.median(quente),
+            'pico_kib': pico_memoria(cliente, rota),
+        }
+    with app.app_context():
+        from models import db
+        db.engine.dispose()
+    return resultados
+
+
+def main():
+    tamanhos = [int(valor) for valor in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000,1000000').split(',')]
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    arquivo = sys.argv[3] if len(sys.argv) > 3 else None
+    anteriores = {}
+    if arquivo and os.path.exists(arquivo):
+        with open(arquivo) as entrada:
+            anteriores = json.load(entrada)
+
+    pasta_fixa = os.environ.get('CHAVEIRO_BENCH_DADOS')
+    with tempfile.TemporaryDirectory() as temporaria:
+        pasta = pasta_fixa or temporaria
+        os.makedirs(pasta, exist_ok=True)
+        resultados = {}
+        for tamanho in tamanhos:
+            print(f'{tamanho} vendas, {repeticoes} repetições por rota')
+            print(f'  {"rota":<32}{"frio p50":>10}{"frio p95":>10}{"quente p50":>12}{"pico KiB":>10}')
+            medidas = medir(tamanho, pasta, repeticoes)
+            resultados[str(tamanho)] = medidas
+            for rota, medida in medidas.items():
+                linha = (f'  {rota:<32}{medida["frio_p50"]:>10.1f}{medida["frio_p95"]:>10.1f}'
+                         f'{medida["quente_p50"]:>12.1f}{medida["pico_kib"]:>10.0f}')
+                anterior = anteriores.get(str(tamanho), {}).get(rota)
+                if anterior:
+                    variacao = (medida['frio_p50'] / anterior['frio_p50'] - 1) * 100
+                    linha += f'   {variacao:+.0f}%'
+                print(linha)
+
+    if arquivo:
+        with open(arquivo, 'w') as saida:
+            json.dump({**anteriores, **resultados}, saida, indent=2)
+        print(f'resultados gravados em {arquivo}')
+
+
+if __name__ == '__main__':
+    main()
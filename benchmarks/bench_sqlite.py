@@ -0,0 +1,108 @@
+"""Vazão de leituras e escritas concorrentes no SQLite, antes e depois do ajuste.
+
+"padrao": journal em modo DELETE, sem índices por data (como o sistema.db original).
+"ajustado": pragmas e pool de banco.py, mais os índices de cobertura por data.
+
+Uso: python benchmarks/bench_sqlite.py [linhas] [segundos] [leitores] [escritores]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+import banco  # noqa: E402
+from models import db  # noqa: E402
+
+LEITURA = text('SELECT SUM(valor_total_centavos) FROM venda WHERE data >= :inicio AND data < :fim')
+ESCRITA = text('INSERT INTO venda (data, descricao, unidade, valor_unitario_centavos, valor_total_centavos) '
+               'VALUES (:data, :descricao, :unidade, :valor_unitario_centavos, :valor_total_centavos)')
+
+
+def linha_aleatoria():
+    unidade, valor = random.randint(1, 5), random.choice([750, 1500, 3500, 12000])
+    return {
+        'data': f'{random.randint(2020, 2024)}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}',
+        'descricao': random.choice(['Cópia de chave', 'Chave tetra', 'Controle de portão']),
+        'unidade': unidade,
+        'valor_unitario_centavos': valor,
+        'valor_total_centavos': unidade * valor,
+    }
+
+
+def preparar(caminho, ajustado, linhas):
+    uri = f'sqlite:///{caminho}'
+    engine = create_engine(uri, **(banco.opcoes_engine(uri) if ajustado else {}))
+    if ajustado:
+        banco.configurar(engine)
+    banco.preparar(engine, db.metadata)
+    with engine.begin() as conexao:
+        if not ajustado:
+            for tabela in ('venda', 'gasto'):
+                for indice in db.metadata.tables[tabela].indexes:
+                    conexao.exec_driver_sql(f'DROP INDEX {indice.name}')
+        conexao.execute(ESCRITA, [linha_aleatoria() for _ in range(linhas)])
+        conexao.exec_driver_sql('ANALYZE')
+    return engine
+
+
+def executar(engine, segundos, leitores, escritores):
+    contagem = {'leituras': 0, 'escritas': 0, 'bloqueios': 0}
+    trava = threading.Lock()
+    fim = time.monotonic() + segundos
+
+    def somar(chave):
+        with trava:
+            contagem[chave] += 1
+
+    def ler():
+        while time.monotonic() < fim:
+            ano, mes = random.randint(2020, 2024), random.randint(1, 11)
+            try:
+                with engine.connect() as conexao:
+                    conexao.execute(LEITURA, {'inicio': f'{ano}-{mes:02d}-01',
+                                              'fim': f'{ano}-{mes + 1:02d}-01'}).scalar()
+                somar('leituras')
+            except OperationalError:
+                somar('bloqueios')
+
+    def escrever():
+        while time.monotonic() < fim:
+            try:
+                with engine.begin() as conexao:
+                    conexao.execute(ESCRITA, linha_aleatoria())
+                somar('escritas')
+            except OperationalError:
+                somar('bloqueios')
+
+    threads = [threading.Thread(target=ler) for _ in range(leitores)]
+    threads += [threading.Thread(target=escrever) for _ in range(escritores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {chave: valor / segundos for chave, valor in contagem.items()}
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    linhas, segundos, leitores, escritores = argumentos + [50000, 5, 8, 2][len(argumentos):]
+    print(f'{linhas} vendas, {leitores} leitores, {escritores} escritores, {segundos}s por modo')
+    print(f'{"modo":<10}{"leituras/s":>12}{"escritas/s":>12}{"bloqueios/s":>13}')
+    with tempfile.TemporaryDirectory() as pasta:
+        for modo in ('padrao', 'ajustado'):
+            engine = preparar(os.path.join(pasta, f'{modo}.db'), modo == 'ajustado', linhas)
+            resultado = executar(engine, segundos, leitores, escritores)
+            engine.dispose()
+            print(f'{modo:<10}{resultado["leituras"]:>12.0f}{resultado["escritas"]:>12.0f}'
+                  f'{resultado["bloqueios"]:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
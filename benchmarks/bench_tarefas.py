@@ -0,0 +1,95 @@
+"""Latência dos cadastros enquanto relatórios pesados rodam.
+
+Terminais gravam vendas pelo formulário da página inicial enquanto outros clientes pedem
+exportações do histórico inteiro. Compara as exportações feitas dentro da requisição
+(GET /export/vendas) com as enviadas ao executor de tarefas (?assincrono=1, ver
+tarefas.py), que roda no máximo TAREFAS_SIMULTANEAS por vez.
+
+Uso: python benchmarks/bench_tarefas.py [vendas] [segundos] [terminais] [relatorios]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from gerar_dados import gerar  # noqa: E402
+
+FORMULARIO = {'cadastrar_venda': '1', 'data': date.today().isoformat(), 'descricao': 'Cópia de chave simples',
+              'unidade': '1', 'valor_unitario': '10'}
+
+
+def terminal(app, fim, latencias):
+    cliente = app.test_client()
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        cliente.post('/', data=FORMULARIO)
+        latencias.append(time.perf_counter() - inicio)
+        time.sleep(0.05)
+
+
+def relatorio(app, fim, numero, assincrono, prontos):
+    # Cada pedido começa num dia diferente, bem antes dos dados, para a deduplicação não
+    # juntar os relatórios; todos cobrem o histórico inteiro
+    cliente = app.test_client()
+    pedido = 0
+    while time.perf_counter() < fim:
+        pedido += 1
+        de = (date(1900, 1, 1) + timedelta(days=numero * 10000 + pedido)).isoformat()
+        if not assincrono:
+            resposta = cliente.get(f'/export/vendas?de={de}')
+            b''.join(resposta.response)
+            prontos.append(1)
+            continue
+        status = cliente.get(f'/export/vendas?de={de}&assincrono=1').headers['Location']
+        while time.perf_counter() < fim:
+            if cliente.get(status).get_json()['estado'] in ('concluida', 'falhou'):
+                prontos.append(1)
+                break
+            time.sleep(0.2)
+
+
+def medir(app, segundos, terminais, relatorios, assincrono):
+    latencias, prontos = [], []
+    fim = time.perf_counter() + segundos
+    threads = [threading.Thread(target=terminal, args=(app, fim, latencias)) for _ in range(terminais)]
+    threads += [threading.Thread(target=relatorio, args=(app, fim, numero, assincrono, prontos))
+                for numero in range(relatorios)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencias.sort()
+    return {
+        'p50': statistics.median(latencias) * 1000,
+        'p95': latencias[int(len(latencias) * 0.95)] * 1000,
+        'cadastros': len(latencias),
+        'relatorios': len(prontos),
+    }
+
+
+def main():
+    argumentos = [int(valor) for valor in sys.argv[1:]]
+    vendas, segundos, terminais, relatorios = argumentos + [200000, 10, 4, 4][len(argumentos):]
+    with tempfile.TemporaryDirectory() as pasta:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "tarefas.db")}',
+                          'WTF_CSRF_ENABLED': False, 'PASTA_TAREFAS': os.path.join(pasta, 'tarefas')})
+        with app.app_context():
+            gerar(vendas)
+        print(f'{"relatórios":<14}{"p50 ms":>9}{"p95 ms":>9}{"cadastros":>11}{"relatórios":>12}')
+        medida = medir(app, segundos, terminais, 0, False)
+        print(f'{"nenhum":<14}{medida["p50"]:>9.1f}{medida["p95"]:>9.1f}{medida["cadastros"]:>11}{"-":>12}')
+        for assincrono in (False, True):
+            medida = medir(app, segundos, terminais, relatorios, assincrono)
+            modo = 'tarefas' if assincrono else 'na requisição'
+            print(f'{modo:<14}{medida["p50"]:>9.1f}{medida["p95"]:>9.1f}{medida["cadastros"]:>11}'
+                  f'{medida["relatorios"]:>12}')
+
+
+if __name__ == '__main__':
+    main()
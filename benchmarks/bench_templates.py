@@ -0,0 +1,52 @@
+"""Compara o tempo de renderização por requisição das três páginas.
+
+"antes": render_template_string com o código-fonte do template, como o app
+fazia (o Jinja reanalisa e recompila a cada chamada).
+"depois": render_template com o template já compilado pelo loader.
+
+Uso: python benchmarks/bench_templates.py [repeticoes]
+"""
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template, render_template_string  # noqa: E402
+
+from app import create_app  # noqa: E402
+from formularios import VendaForm, GastoForm  # noqa: E402
+
+app = create_app()
+
+
+def contexto(nome):
+    if nome != 'index.html':
+        return {'figura': '{"data": [], "layout": {}}', 'plotly_js': 'plotly.min.js', 'modo': 'servidor',
+                'grafico': nome[len('dashboard_'):-len('.html')], 'tabelas': ('venda', 'gasto'),
+                'filtros': {'periodo': 'mes', 'de': None, 'ate': None}}
+    vendas = [SimpleNamespace(data='2024-11-17', descricao=f'Cópia de chave {i}',
+                              unidade=2, valor_unitario=7.5, valor_total=15.0) for i in range(20)]
+    gastos = [SimpleNamespace(data='2024-11-17', descricao=f'Fornecedor {i}',
+                              valor=120.0) for i in range(20)]
+    return {'vendas': vendas, 'gastos': gastos,
+            'proximo_vendas': '2024-11-17_1', 'proximo_gastos': None,
+            'vendas_form': VendaForm(), 'gastos_form': GastoForm()}
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f'{"página":<24}{"antes (ms)":>12}{"depois (ms)":>13}{"ganho":>8}')
+    with app.test_request_context():
+        for nome in ('index.html', 'dashboard_vendas.html', 'dashboard_gastos.html'):
+            fonte = app.jinja_loader.get_source(app.jinja_env, nome)[0]
+            valores = contexto(nome)
+            antes = timeit.timeit(lambda: render_template_string(fonte, **valores), number=repeticoes)
+            depois = timeit.timeit(lambda: render_template(nome, **valores), number=repeticoes)
+            antes, depois = antes / repeticoes * 1000, depois / repeticoes * 1000
+            print(f'{nome:<24}{antes:>12.3f}{depois:>13.3f}{antes / depois:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Gera vendas e gastos sintéticos, com distribuições parecidas com as de um chaveiro.
+
+- Vendas: mix de serviços (cópias são a maioria, serviços caros são raros), mais
+  movimento aos sábados e em dezembro, loja quase parada aos domingos e um
+  crescimento gradual ao longo do período.
+- Gastos: contas fixas todo mês (aluguel, energia, internet, contador) e compras
+  de material em quantidade proporcional às vendas.
+
+Grava direto em centavos com executemany, em lotes, e recalcula os resumos no
+final com uma única consulta. Com a semente fixa, o mesmo tamanho gera sempre os
+mesmos dados.
+
+Uso: python benchmarks/gerar_dados.py BANCO.db [vendas] [anos]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resumos  # noqa: E402
+from models import db, marcar_alteracao  # noqa: E402
+
+# (descrição, preço em centavos, peso no mix, pesos de 1, 2, 3... unidades)
+PRODUTOS = (
+    ('Cópia de chave simples', 1000, 40, (60, 25, 10, 5)),
+    ('Cópia de chave tetra', 2500, 15, (70, 20, 10)),
+    ('Cópia de chave gorje', 1500, 10, (70, 20, 10)),
+    ('Chaveiro personalizado', 800, 5, (50, 30, 20)),
+    ('Controle de portão', 6000, 8, (85, 15)),
+    ('Cadeado', 4500, 6, (80, 20)),
+    ('Abertura de porta', 12000, 5, (100,)),
+    ('Troca de segredo', 9000, 4, (100,)),
+    ('Fechadura', 11000, 3, (90, 10)),
+    ('Chave codificada automotiva', 18000, 4, (100,)),
+)
+
+# Segunda a domingo e janeiro a dezembro
+PESO_DIA_SEMANA = (1.0, 1.0, 1.0, 1.1, 1.2, 1.5, 0.15)
+PESO_MES = (0.85, 0.9, 1.0, 1.0, 1.0, 0.95, 1.05, 1.0, 1.0, 1.0, 1.1, 1.35)
+
+# (descrição, valor médio em centavos, dia do mês)
+CONTAS_FIXAS = (
+    ('Aluguel da loja', 150000, 5),
+    ('Energia elétrica', 28000, 10),
+    ('Internet e telefone', 12000, 12),
+    ('Contador', 45000, 20),
+)
+COMPRAS = (
+    ('Chaves virgens (fornecedor)', 35000),
+    ('Controles e cadeados (fornecedor)', 60000),
+    ('Ferramentas e manutenção', 15000),
+)
+VENDAS_POR_COMPRA = 40
+
+LOTE = 50000
+
+INSERIR_VENDA = ('INSERT INTO venda (data, descricao, unidade, valor_unitario_centavos, valor_total_centavos) '
+                 'VALUES (?, ?, ?, ?, ?)')
+INSERIR_GASTO = 'INSERT INTO gasto (data, descricao, valor_centavos) VALUES (?, ?, ?)'
+
+
+def pesos_dias(inicio, dias):
+    # Sazonalidade semanal e anual, com crescimento de 30% do início ao fim do período
+    return [
+        PESO_DIA_SEMANA[dia.weekday()] * PESO_MES[dia.month - 1] * (0.85 + 0.3 * numero / dias)
+        for numero, dia in ((numero, inicio + timedelta(days=numero)) for numero in range(dias))
+    ]
+
+
+def _acumulados(pesos):
+    total, acumulados = 0, []
+    for peso in pesos:
+        total += peso
+        acumulados.append(total)
+    return acumulados
+
+
+def linhas_vendas(sorteio, quantidade, inicio, dias):
+    datas = [(inicio + timedelta(days=numero)).isoformat() for numero in range(dias)]
+    acumulado_dias = _acumulados(pesos_dias(inicio, dias))
+    acumulado_produtos = _acumulados([produto[2] for produto in PRODUTOS])
+    unidades = [(range(1, len(pesos) + 1), _acumulados(pesos)) for *_, pesos in PRODUTOS]
+    while quantidade > 0:
+        tamanho = min(LOTE, quantidade)
+        quantidade -= tamanho
+        escolhidos = sorteio.choices(range(len(PRODUTOS)), cum_weights=acumulado_produtos, k=tamanho)
+        dias_sorteados = sorteio.choices(datas, cum_weights=acumulado_dias, k=tamanho)
+        lote = []
+        for indice, dia in zip(escolhidos, dias_sorteados):
+            descricao, preco, _, _ = PRODUTOS[indice]
+            valores, pesos = unidades[indice]
+            unidade = sorteio.choices(valores, cum_weights=pesos)[0]
+            lote.append((dia, descricao, unidade, preco, unidade * preco))
+        yield lote
+
+
+def linhas_gastos(sorteio, vendas, inicio, dias):
+    fim = inicio + timedelta(days=dias - 1)
+    lote = []
+    mes = inicio.replace(day=1)
+    while mes <= fim:
+        for descricao, valor, dia in CONTAS_FIXAS:
+            data = mes.replace(day=dia)
+            if inicio <= data <= fim:
+                lote.append((data.isoformat(), descricao, round(valor * sorteio.uniform(0.9, 1.1))))
+        mes = (mes + timedelta(days=32)).replace(day=1)
+    for _ in range(vendas // VENDAS_POR_COMPRA):
+        descricao, valor = sorteio.choice(COMPRAS)
+        data = inicio + timedelta(days=sorteio.randrange(dias))
+        lote.append((data.isoformat(), descricao, round(sorteio.lognormvariate(0, 0.4) * valor)))
+        if len(lote) >= LOTE:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def gerar(vendas, anos=3, fim=None, semente=42):
+    # Precisa de um contexto do app; devolve a quantidade de (vendas, gastos) gravados
+    sorteio = random.Random(semente)
+    fim = fim or date.today()
+    dias = int(anos * 365)
+    inicio = fim - timedelta(days=dias - 1)
+    conexao = db.session.connection()
+    gastos = 0
+    for lote in linhas_vendas(sorteio, vendas, inicio, dias):
+        conexao.exec_driver_sql(INSERIR_VENDA, lote)
+    for lote in linhas_gastos(sorteio, vendas, inicio, dias):
+        conexao.exec_driver_sql(INSERIR_GASTO, lote)
+        gastos += len(lote)
+    marcar_alteracao(db.session, 'venda')
+    marcar_alteracao(db.session, 'gasto')
+    db.session.commit()
+    resumos.reconstruir()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+    return vendas, gastos
+
+
+def main():
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__)
+    caminho = os.path.abspath(sys.argv[1])
+    argumentos = [int(valor) for valor in sys.argv[2:]]
+    vendas, anos = argumentos + [100000, 3][len(argumentos):]
+
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}'})
+    with app.app_context():
+        inicio = time.perf_counter()
+        vendas, gastos = gerar(vendas, anos)
+        segundos = time.perf_counter() - inicio
+    print(f'{vendas} vendas e {gastos} gastos em {anos} anos gravados em {caminho} '
+          f'({segundos:.1f}s, {(vendas + gastos) / segundos:,.0f} linhas/s)')
+
+
+if __name__ == '__main__':
+    main()
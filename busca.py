@@ -0,0 +1,81 @@
+import re
+
+from sqlalchemy import select, text
+
+from models import db, Venda, Gasto
+from paginacao import ParametroInvalido, ler_data, ler_limite
+
+TIPOS = {'vendas': Venda, 'gastos': Gasto}
+# Palavras consideradas de uma busca; o resto é ignorado
+MAXIMO_TERMOS = 8
+# 'relevancia' pagina por deslocamento: a ordem por rank exige pontuar todas as ocorrências
+# de qualquer forma, e buscas raramente passam das primeiras páginas. 'recentes' percorre o
+# índice pelo rowid, do maior para o menor, e pagina por chave (o último id entregue).
+ORDENS = ('relevancia', 'recentes')
+MAXIMO_INICIO = 10000
+
+
+def expressao(texto):
+    # Cada palavra vira um prefixo entre aspas ("cop"* acha "cópia"); os acentos são
+    # removidos pelo tokenizador, e aspas e operadores digitados não viram sintaxe do FTS5
+    termos = re.findall(r'\w+', texto or '')[:MAXIMO_TERMOS]
+    if not termos:
+        raise ParametroInvalido("'q' deve ter ao menos uma palavra")
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def ler_cursor(valor, ordem):
+    if not valor:
+        return None
+    try:
+        cursor = int(valor)
+    except ValueError:
+        raise ParametroInvalido('cursor inválido')
+    if cursor < 0 or (ordem == 'relevancia' and cursor > MAXIMO_INICIO):
+        raise ParametroInvalido('cursor inválido')
+    return cursor
+
+
+def buscar(modelo, termos, limite, ordem='relevancia', cursor=None, de=None, ate=None):
+    tabela = modelo.__tablename__
+    indice = f'{tabela}_busca'
+    filtros = ''
+    if de:
+        filtros += f' AND {tabela}.data >= :de'
+    if ate:
+        filtros += f' AND {tabela}.data <= :ate'
+    if ordem == 'recentes':
+        if cursor is not None:
+            filtros += f' AND {indice}.rowid < :cursor'
+        ordenacao = f'{indice}.rowid DESC LIMIT :limite'
+    else:
+        # Melhores resultados primeiro (bm25); empate pelo registro mais recente
+        ordenacao = f'{indice}.rank, {indice}.rowid DESC LIMIT :limite OFFSET :cursor'
+    consulta = text(
+        f'SELECT {tabela}.* FROM {indice} JOIN {tabela} ON {tabela}.id = {indice}.rowid '
+        f'WHERE {indice} MATCH :termos{filtros} ORDER BY {ordenacao}'
+    )
+    itens = db.session.scalars(select(modelo).from_statement(consulta), {
+        'termos': termos, 'de': str(de), 'ate': str(ate), 'limite': limite + 1, 'cursor': cursor or 0,
+    }).all()
+    proximo = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        proximo = str(itens[-1].id if ordem == 'recentes' else (cursor or 0) + limite)
+    return itens, proximo
+
+
+def pagina(tipo, argumentos):
+    ordem = argumentos.get('ordem', 'relevancia')
+    if ordem not in ORDENS:
+        raise ParametroInvalido("'ordem' deve ser relevancia ou recentes")
+    itens, proximo = buscar(
+        TIPOS[tipo],
+        expressao(argumentos.get('q')),
+        limite=ler_limite(argumentos.get('limite')),
+        ordem=ordem,
+        cursor=ler_cursor(argumentos.get('cursor'), ordem),
+        de=ler_data(argumentos.get('de'), 'de'),
+        ate=ler_data(argumentos.get('ate'), 'ate'),
+    )
+    return {'itens': [item.como_dict() for item in itens], 'proximo': proximo}
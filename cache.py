@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+from models import dados_alterados
+
+
+# Cache em memória com expiração por tempo e invalidação explícita. Os itens ficam na ordem em
+# que vencem (o ttl é fixo), então os vencidos e os que passam do máximo saem do começo
+class CacheTTL:
+    def __init__(self, ttl=60, maximo=256):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._itens = {}
+        self._geracao = 0
+        self._trava = threading.Lock()
+
+    def obter(self, chave, calcular):
+        agora = time.monotonic()
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None and item[0] > agora:
+                return item[1]
+            geracao = self._geracao
+        valor = calcular()
+        with self._trava:
+            # Não guarda valores calculados antes de uma invalidação concorrente
+            if geracao == self._geracao:
+                self._itens.pop(chave, None)
+                self._itens[chave] = (agora + self.ttl, valor)
+                while self._itens:
+                    primeira = next(iter(self._itens))
+                    if self._itens[primeira][0] > agora and len(self._itens) <= self.maximo:
+                        break
+                    del self._itens[primeira]
+        return valor
+
+    def invalidar(self, tabela=None):
+        # As chaves são tuplas cujo primeiro elemento é o nome da tabela (ou uma tupla de nomes)
+        with self._trava:
+            self._geracao += 1
+            if tabela is None:
+                self._itens.clear()
+            else:
+                for chave in [c for c in self._itens if tabela in _tabelas(c)]:
+                    del self._itens[chave]
+
+
+def _tabelas(chave):
+    # Consultas que cruzam tabelas usam uma tupla de nomes como primeiro elemento
+    return chave[0] if isinstance(chave[0], tuple) else (chave[0],)
+
+
+# Cache em memória sem expiração, para valores cuja chave já inclui a versão dos dados:
+# uma chave antiga simplesmente deixa de ser pedida e sai pelo LRU
+class CacheLRU:
+    def __init__(self, maximo=128):
+        self.maximo = maximo
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, calcular):
+        with self._trava:
+            if chave in self._itens:
+                self.acertos += 1
+                self._itens.move_to_end(chave)
+                return self._itens[chave]
+            self.falhas += 1
+        valor = calcular()
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+        return valor
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'itens': len(self._itens),
+                'maximo': self.maximo,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 3) if consultas else None,
+            }
+
+
+cache_resumos = CacheTTL(ttl=30, maximo=256)
+cache_figuras = CacheLRU(maximo=128)
+
+
+@dados_alterados.connect
+def _invalidar_resumos(sender, tabelas, **extras):
+    for tabela in tabelas:
+        cache_resumos.invalidar(tabela)
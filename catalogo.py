@@ -0,0 +1,187 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+from flask import current_app
+from sqlalchemy import bindparam, func, select, update
+from werkzeug.datastructures import MultiDict
+
+from formularios import ProdutoForm
+from importacao import texto_celula
+from models import db, Produto, Venda, dados_alterados, marcar_alteracao, versoes
+from paginacao import ParametroInvalido
+
+CAMPOS = ('codigo', 'nome', 'preco')
+SUGESTOES_PADRAO = 8
+MAXIMO_SUGESTOES = 50
+# Produtos gravados por vez em /api/produtos
+MAXIMO_PRODUTOS = 500
+# De quanto em quanto tempo a versão do catálogo é conferida, para notar produtos gravados
+# por outros processos (workers); os deste processo chegam pelo sinal na hora
+INTERVALO_VERIFICACAO = 2
+ORDENS_RANKING = ('total', 'unidades')
+
+
+class ProdutoInvalido(ValueError):
+    pass
+
+
+def normalizar(texto):
+    # 'Cópia  de Chave' -> 'copia de chave': a sugestão ignora acentos, maiúsculas e espaços extras
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode()
+    return ' '.join(texto.lower().split())
+
+
+def _chaves(codigo, nome):
+    # O código, o nome e o nome a partir de cada palavra: 'yale' acha 'Cópia chave Yale'
+    palavras = normalizar(nome).split()
+    return {normalizar(codigo)} | {' '.join(palavras[inicio:]) for inicio in range(len(palavras))}
+
+
+# Índice de prefixos do catálogo em memória: uma lista ordenada de chaves normalizadas e, em
+# paralelo, o id do produto de cada uma. A sugestão é uma busca binária (bisect) pelo texto
+# digitado e uma leitura sequencial enquanto as chaves começarem por ele, sem ir ao banco.
+class IndiceProdutos:
+    def __init__(self):
+        # (chaves, ids, produtos) trocados juntos, para as leituras nunca verem metade de uma carga
+        self._dados = ([], [], {})
+        self._versao = None
+        self._conferido = 0
+        self._trava = threading.Lock()
+
+    def invalidar(self):
+        self._versao = None
+
+    def atualizar(self):
+        agora = time.monotonic()
+        if self._versao is not None and agora - self._conferido < INTERVALO_VERIFICACAO:
+            return
+        with self._trava:
+            versao, = versoes(('produto',))
+            if versao != self._versao:
+                self._carregar(versao)
+            self._conferido = agora
+
+    def _carregar(self, versao):
+        # A versão é lida antes dos produtos: um commit no meio só causa uma recarga a mais
+        entradas, produtos = [], {}
+        # Colunas em vez de objetos do ORM: a carga de milhares de produtos fica bem mais barata
+        for id_, codigo, nome, preco_centavos in db.session.execute(
+                select(Produto.id, Produto.codigo, Produto.nome, Produto.preco_centavos)):
+            produtos[id_] = {'id': id_, 'codigo': codigo, 'nome': nome, 'preco': preco_centavos / 100}
+            entradas += [(chave, id_) for chave in _chaves(codigo, nome)]
+        entradas.sort()
+        self._dados = ([chave for chave, _ in entradas], [id_ for _, id_ in entradas], produtos)
+        self._versao = versao
+
+    def produtos(self):
+        self.atualizar()
+        return self._dados[2]
+
+    def sugerir(self, texto, limite=SUGESTOES_PADRAO):
+        self.atualizar()
+        chaves, ids, produtos = self._dados
+        prefixo = normalizar(texto)
+        encontrados = {}
+        if not prefixo:
+            return []
+        for posicao in range(bisect.bisect_left(chaves, prefixo), len(chaves)):
+            if len(encontrados) >= limite or not chaves[posicao].startswith(prefixo):
+                break
+            encontrados.setdefault(ids[posicao], produtos[ids[posicao]])
+        return list(encontrados.values())
+
+
+def indice():
+    return current_app.extensions['catalogo']
+
+
+def ler_limite_sugestoes(valor):
+    if not valor:
+        return SUGESTOES_PADRAO
+    try:
+        return max(1, min(int(valor), MAXIMO_SUGESTOES))
+    except ValueError:
+        raise ParametroInvalido("'limite' deve ser um número inteiro")
+
+
+def salvar(lote):
+    # Grava um produto ou uma lista deles; um código já cadastrado tem nome e preço atualizados
+    itens = lote if isinstance(lote, list) else [lote]
+    if not itens or len(itens) > MAXIMO_PRODUTOS or not all(isinstance(item, dict) for item in itens):
+        raise ProdutoInvalido(f'Envie um produto ou uma lista de até {MAXIMO_PRODUTOS} produtos')
+    form = ProdutoForm(formdata=None, meta={'csrf': False})
+    registros = {}
+    for numero, item in enumerate(itens, start=1):
+        form.process(MultiDict({campo: texto_celula(item.get(campo)).strip() for campo in CAMPOS}))
+        if not form.validate():
+            erros = '; '.join(f'{campo}: {", ".join(mensagens)}' for campo, mensagens in form.errors.items())
+            raise ProdutoInvalido(f'Produto {numero}: {erros}')
+        registros[form.codigo.data] = {campo: getattr(form, campo).data for campo in CAMPOS}
+
+    existentes = {produto.codigo: produto for produto in db.session.scalars(
+        select(Produto).where(Produto.codigo.in_(registros)))}
+    for codigo, registro in registros.items():
+        produto = existentes.setdefault(codigo, Produto(codigo=codigo))
+        produto.nome = registro['nome']
+        produto.preco = registro['preco'] or 0
+        db.session.add(produto)
+    db.session.commit()
+    return {'produtos': [existentes[codigo].como_dict() for codigo in registros]}
+
+
+def ranking(de=None, ate=None, limite=20, ordem='total'):
+    # Soma por produto_id pelo índice ix_venda_produto (produto_id, data, unidade, total):
+    # as vendas já chegam agrupadas pelo produto, sem comparar descrições
+    unidades = func.sum(Venda.unidade)
+    total = func.sum(Venda.valor_total_centavos)
+    consulta = select(Venda.produto_id, func.count(), unidades, total).where(Venda.produto_id.is_not(None))
+    if de:
+        consulta = consulta.where(Venda.data >= de)
+    if ate:
+        consulta = consulta.where(Venda.data <= ate)
+    criterio = total if ordem == 'total' else unidades
+    consulta = consulta.group_by(Venda.produto_id).order_by(criterio.desc(), Venda.produto_id).limit(limite)
+    produtos = indice().produtos()
+    return {'ordem': ordem, 'itens': [
+        {'produto': produtos.get(produto_id, {'id': produto_id}), 'vendas': vendas, 'unidades': soma_unidades,
+         'total': soma_total / 100}
+        for produto_id, vendas, soma_unidades, soma_total in db.session.execute(consulta)
+    ]}
+
+
+def vincular():
+    # Liga ao catálogo as vendas sem produto cuja descrição é o nome ou o código de um
+    # produto (sem diferença de acentos, maiúsculas e espaços)
+    nomes = {}
+    for produto in indice().produtos().values():
+        nomes.setdefault(normalizar(produto['codigo']), produto['id'])
+        nomes[normalizar(produto['nome'])] = produto['id']
+    ligacoes, por_descricao = [], {}
+    for venda_id, descricao in db.session.execute(
+            select(Venda.id, Venda.descricao).where(Venda.produto_id.is_(None))):
+        if descricao not in por_descricao:
+            por_descricao[descricao] = nomes.get(normalizar(descricao))
+        if por_descricao[descricao] is not None:
+            ligacoes.append({'b_id': venda_id, 'b_produto': por_descricao[descricao]})
+    if ligacoes:
+        # UPDATE executemany pela chave primária, fora do ORM (não altera valores nem resumos)
+        tabela = Venda.__table__
+        db.session.connection().execute(
+            update(tabela).where(tabela.c.id == bindparam('b_id')).values(produto_id=bindparam('b_produto')),
+            ligacoes)
+        marcar_alteracao(db.session, 'venda')
+    db.session.commit()
+    return len(ligacoes)
+
+
+def instalar(app):
+    catalogo = IndiceProdutos()
+    app.extensions['catalogo'] = catalogo
+
+    def invalidar(sender, tabelas, **extras):
+        if 'produto' in tabelas:
+            catalogo.invalidar()
+    app.extensions['catalogo_receptor'] = invalidar
+    dados_alterados.connect(invalidar)
@@ -0,0 +1,284 @@
+import json
+import os
+import shutil
+from datetime import date
+
+from sqlalchemy import func, literal, select
+
+from models import db, Venda, Gasto, Resumo
+
+# Colunas gravadas de cada tabela e as que viram (unidades, total) nas agregações
+TABELAS = {
+    'venda': (Venda, ('id', 'data', 'descricao', 'unidade', 'valor_unitario_centavos', 'valor_total_centavos'),
+              'unidade', 'valor_total_centavos'),
+    'gasto': (Gasto, ('id', 'data', 'descricao', 'valor_centavos'), None, 'valor_centavos'),
+}
+LINHAS_POR_ARQUIVO = 500000
+# Partições com mais arquivos que isso (um por execução que as tocou) são compactadas
+ARQUIVOS_POR_PARTICAO = 24
+MARCA = '_marca.json'
+
+
+class ColunarIndisponivel(RuntimeError):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ColunarIndisponivel('Instale o pacote pyarrow para usar os arquivos colunares')
+    return pyarrow, pyarrow.parquet
+
+
+# Cópia em Parquet das vendas e gastos, particionada no formato do Hive:
+#   PASTA/venda/ano=2024/mes=03/parte-000000000101-000000000250.parquet
+# Cada execução acrescenta só as linhas com id acima da marca gravada em PASTA/venda/_marca.json,
+# junto com os totais de cada partição. Meses cujos totais não batem mais com os resumos
+# (linhas alteradas ou excluídas depois de copiadas) são regravados inteiros.
+
+def _ler_marca(pasta):
+    caminho = os.path.join(pasta, MARCA)
+    if not os.path.exists(caminho):
+        return {'ultimo_id': 0, 'particoes': {}}
+    with open(caminho) as arquivo:
+        return json.load(arquivo)
+
+
+def _gravar_marca(pasta, marca):
+    temporario = os.path.join(pasta, f'{MARCA}.{os.getpid()}.tmp')
+    with open(temporario, 'w') as arquivo:
+        json.dump(marca, arquivo)
+    os.replace(temporario, os.path.join(pasta, MARCA))
+
+
+def _particao(pasta, mes):
+    ano, numero = mes.split('-')
+    return os.path.join(pasta, f'ano={ano}', f'mes={numero}')
+
+
+def _gravar_arquivo(pasta, tabela, mes, linhas):
+    pa, pq = _pyarrow()
+    _, colunas, _, _ = TABELAS[tabela]
+    tipos = {'id': pa.int64(), 'data': pa.date32(), 'descricao': pa.string()}
+    dados = pa.table({
+        coluna: pa.array([linha[indice] for linha in linhas], tipos.get(coluna, pa.int64()))
+        for indice, coluna in enumerate(colunas)
+    })
+    destino = _particao(pasta, mes)
+    os.makedirs(destino, exist_ok=True)
+    nome = f'parte-{linhas[0][0]:012d}-{linhas[-1][0]:012d}.parquet'
+    temporario = os.path.join(destino, f'.{nome}.tmp')
+    pq.write_table(dados, temporario, compression='zstd')
+    os.replace(temporario, os.path.join(destino, nome))
+
+
+def _estatisticas(tabela, linhas):
+    _, colunas, unidades, total = TABELAS[tabela]
+    indice_unidades = colunas.index(unidades) if unidades else None
+    indice_total = colunas.index(total)
+    return [
+        len(linhas),
+        sum(linha[indice_unidades] for linha in linhas) if unidades else 0,
+        sum(linha[indice_total] for linha in linhas),
+    ]
+
+
+def _copiar(pasta, tabela, marca, consulta):
+    # Grava as linhas (em ordem de data) mês a mês, em arquivos de até LINHAS_POR_ARQUIVO
+    mes_atual, pendentes = None, []
+
+    def descarregar():
+        if pendentes:
+            _gravar_arquivo(pasta, tabela, mes_atual, pendentes)
+            soma = marca['particoes'].get(mes_atual, [0, 0, 0])
+            marca['particoes'][mes_atual] = [a + b for a, b in zip(soma, _estatisticas(tabela, pendentes))]
+            pendentes.clear()
+
+    resultado = db.session.execute(consulta.execution_options(yield_per=LINHAS_POR_ARQUIVO))
+    for particao in resultado.partitions():
+        for linha in particao:
+            mes = linha[1].isoformat()[:7]
+            if mes != mes_atual or len(pendentes) >= LINHAS_POR_ARQUIVO:
+                descarregar()
+                mes_atual = mes
+            pendentes.append(tuple(linha))
+    descarregar()
+
+
+def _regravar(pasta, tabela, marca, mes, ate_id):
+    # Monta uma cópia atual do mês (até o id da marca) em _trabalho e troca pela partição antiga;
+    # o pyarrow ignora pastas com '_' no início e o duckdb só lê o padrão ano=*/mes=*
+    modelo, colunas, _, _ = TABELAS[tabela]
+    trabalho = os.path.join(pasta, '_trabalho')
+    shutil.rmtree(trabalho, ignore_errors=True)
+    marca['particoes'].pop(mes, None)
+    ano, numero = map(int, mes.split('-'))
+    inicio = date(ano, numero, 1)
+    fim = date(ano + numero // 12, numero % 12 + 1, 1)
+    consulta = select(*(getattr(modelo, coluna) for coluna in colunas)).where(
+        modelo.data >= inicio, modelo.data < fim, modelo.id <= ate_id
+    ).order_by(modelo.data, modelo.id)
+    _copiar(trabalho, tabela, marca, consulta)
+
+    destino, nova = _particao(pasta, mes), _particao(trabalho, mes)
+    antiga = os.path.join(trabalho, 'antiga')
+    if os.path.exists(destino):
+        os.replace(destino, antiga)
+    if os.path.exists(nova):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(nova, destino)
+    shutil.rmtree(trabalho, ignore_errors=True)
+
+
+def atualizar_tabela(pasta_base, tabela):
+    modelo, colunas, _, _ = TABELAS[tabela]
+    pasta = os.path.join(pasta_base, tabela)
+    os.makedirs(pasta, exist_ok=True)
+    marca = _ler_marca(pasta)
+    ultimo = db.session.scalar(select(func.max(modelo.id))) or 0
+
+    # Linhas novas desde a última execução
+    novas = select(*(getattr(modelo, coluna) for coluna in colunas)).where(
+        modelo.id > marca['ultimo_id'], modelo.id <= ultimo
+    ).order_by(modelo.data, modelo.id)
+    antes = sum(estatistica[0] for estatistica in marca['particoes'].values())
+    _copiar(pasta, tabela, marca, novas)
+    acrescentadas = sum(estatistica[0] for estatistica in marca['particoes'].values()) - antes
+    marca['ultimo_id'] = ultimo
+
+    # Confere cada mês com os resumos mensais; linhas acima da marca (gravadas durante a
+    # cópia) também fazem o mês divergir, e ele é regravado sem elas
+    resumos = {
+        chave: [registros, unidades, total]
+        for chave, registros, unidades, total in db.session.execute(
+            select(Resumo.chave, Resumo.registros, Resumo.unidades, Resumo.total_centavos)
+            .where(Resumo.tabela == tabela, Resumo.periodo == 'mes', Resumo.registros > 0)
+        )
+    }
+    regravados = []
+    for mes in sorted(set(resumos) | set(marca['particoes'])):
+        particao = _particao(pasta, mes)
+        arquivos = len(os.listdir(particao)) if os.path.isdir(particao) else 0
+        if marca['particoes'].get(mes) != resumos.get(mes) or arquivos > ARQUIVOS_POR_PARTICAO:
+            _regravar(pasta, tabela, marca, mes, ultimo)
+            regravados.append(mes)
+    _gravar_marca(pasta, marca)
+    return {'acrescentadas': acrescentadas, 'regravados': regravados, 'ultimo_id': ultimo}
+
+
+def atualizar(pasta):
+    # Precisa de um contexto do app; uma tabela de cada vez
+    _pyarrow()
+    return {tabela: atualizar_tabela(pasta, tabela) for tabela in TABELAS}
+
+
+def _somas_duckdb(duckdb, pasta, tabela, de, ate):
+    _, _, unidades, total = TABELAS[tabela]
+    arquivos = os.path.join(pasta, tabela, 'ano=*', 'mes=*', 'parte-*.parquet').replace("'", "''")
+    condicoes, parametros = ['TRUE'], []
+    if de:
+        condicoes.append('ano >= ? AND data >= ?')
+        parametros += [de.year, de]
+    if ate:
+        condicoes.append('ano <= ? AND data <= ?')
+        parametros += [ate.year, ate]
+    conexao = duckdb.connect()
+    try:
+        return conexao.execute(
+            f"SELECT data, sum({unidades or 0}), sum({total}) "
+            f"FROM read_parquet('{arquivos}', hive_partitioning = true) "
+            f"WHERE {' AND '.join(condicoes)} GROUP BY data",
+            parametros,
+        ).fetchall()
+    finally:
+        conexao.close()
+
+
+def _somas_pyarrow(pasta, tabela, de, ate):
+    import pyarrow.dataset as ds
+
+    _, _, unidades, total = TABELAS[tabela]
+    conjunto = ds.dataset(os.path.join(pasta, tabela), format='parquet', partitioning='hive',
+                          exclude_invalid_files=True)
+    filtro = None
+    # O filtro pelo ano descarta partições inteiras sem abrir os arquivos
+    if de:
+        filtro = (ds.field('ano') >= de.year) & (ds.field('data') >= de)
+    if ate:
+        ate_filtro = (ds.field('ano') <= ate.year) & (ds.field('data') <= ate)
+        filtro = ate_filtro if filtro is None else filtro & ate_filtro
+    colunas = ['data', total] + ([unidades] if unidades else [])
+    dados = conjunto.to_table(columns=colunas, filter=filtro)
+    agregado = dados.group_by('data').aggregate([(coluna, 'sum') for coluna in colunas[1:]])
+    dias = agregado['data'].to_pylist()
+    totais = agregado[f'{total}_sum'].to_pylist()
+    quantidades = agregado[f'{unidades}_sum'].to_pylist() if unidades else [0] * len(dias)
+    return list(zip(dias, quantidades, totais))
+
+
+def _no_intervalo(dia, de, ate):
+    return (not de or dia >= de) and (not ate or dia <= ate)
+
+
+def diarios(pasta, de=None, ate=None):
+    # Mesmas linhas (tabela, dia, unidades, total) que os resumos diários: as somas por dia vêm
+    # dos arquivos Parquet e as linhas gravadas depois da última cópia, do SQLite. Um mês cujos
+    # totais (cópia + linhas recentes) não batem com o resumo mensal teve linhas alteradas ou
+    # excluídas depois da cópia; até a próxima atualização, ele é lido dos resumos diários.
+    _pyarrow()
+    try:
+        import duckdb
+    except ImportError:  # duckdb é opcional; sem ele o próprio pyarrow agrega
+        duckdb = None
+
+    somas = {}
+    for tabela, (modelo, _, unidades, total) in TABELAS.items():
+        marca = _ler_marca(os.path.join(pasta, tabela))
+        linhas = []
+        if marca['particoes']:
+            if duckdb is not None:
+                linhas += _somas_duckdb(duckdb, pasta, tabela, de, ate)
+            else:
+                linhas += _somas_pyarrow(pasta, tabela, de, ate)
+
+        # Linhas acima da marca, pela chave primária; poucas entre duas atualizações
+        conferencia = {mes: list(estatistica) for mes, estatistica in marca['particoes'].items()}
+        recentes = db.session.execute(select(
+            modelo.data,
+            func.count(),
+            func.sum(getattr(modelo, unidades)) if unidades else literal(0),
+            func.sum(getattr(modelo, total)),
+        ).where(modelo.id > marca['ultimo_id']).group_by(modelo.data)).all()
+        for dia, registros, quantidade, valor in recentes:
+            estatistica = conferencia.setdefault(dia.isoformat()[:7], [0, 0, 0])
+            for indice, parcela in enumerate((registros, quantidade, valor)):
+                estatistica[indice] += int(parcela)
+            if _no_intervalo(dia, de, ate):
+                linhas.append((dia, quantidade, valor))
+
+        mensais = {
+            chave: [registros, quantidade, valor]
+            for chave, registros, quantidade, valor in db.session.execute(
+                select(Resumo.chave, Resumo.registros, Resumo.unidades, Resumo.total_centavos)
+                .where(Resumo.tabela == tabela, Resumo.periodo == 'mes', Resumo.registros > 0)
+            )
+        }
+        divergentes = {mes for mes in set(conferencia) | set(mensais) if conferencia.get(mes) != mensais.get(mes)}
+        if divergentes:
+            linhas = [linha for linha in linhas if linha[0].isoformat()[:7] not in divergentes]
+            diarios_resumo = select(Resumo.chave, Resumo.unidades, Resumo.total_centavos).where(
+                Resumo.tabela == tabela, Resumo.periodo == 'dia',
+                func.substr(Resumo.chave, 1, 7).in_(sorted(divergentes)),
+            )
+            for chave, quantidade, valor in db.session.execute(diarios_resumo):
+                dia = date.fromisoformat(chave)
+                if _no_intervalo(dia, de, ate):
+                    linhas.append((dia, quantidade, valor))
+
+        for dia, quantidade, valor in linhas:
+            chave = (tabela, dia.isoformat())
+            anterior = somas.get(chave, (0, 0))
+            somas[chave] = (anterior[0] + int(quantidade), anterior[1] + int(valor))
+    return [(tabela, dia, unidades, total) for (tabela, dia), (unidades, total) in sorted(somas.items())]
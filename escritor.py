@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from models import db
+
+# Máximo de linhas por transação e quanto o escritor espera por mais pedidos depois do primeiro
+MAXIMO_LOTE = 200
+ESPERA_LOTE = 0.002
+# Quanto uma requisição espera pela gravação antes de desistir
+PRAZO_GRAVACAO = 30
+
+
+# Escritor único por processo: os cadastros entram numa fila e uma thread os grava em
+# transações agrupadas. Com vários terminais gravando ao mesmo tempo, o SQLite recebe
+# um commit por lote em vez de um por requisição, e as conexões não disputam a trava
+# de escrita do banco.
+class Escritor:
+    def __init__(self, app, maximo_lote=MAXIMO_LOTE, espera=ESPERA_LOTE):
+        self.app = app
+        self.maximo_lote = maximo_lote
+        self.espera = espera
+        self.lotes = 0
+        self.gravados = 0
+        self._agrupando = False
+        self._fila = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._trava = threading.Lock()
+
+    def gravar(self, modelo, **valores):
+        # Devolve o id depois do commit; erros da gravação são relançados aqui
+        futuro = Future()
+        self._iniciar()
+        self._fila.put((modelo, valores, futuro))
+        return futuro.result(PRAZO_GRAVACAO)
+
+    def _iniciar(self):
+        # Sob demanda, e de novo num processo filho: threads não sobrevivem ao fork
+        with self._trava:
+            if self._pid != os.getpid():
+                self._fila = queue.Queue()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                # A fila é mantida: pedidos deixados por uma thread que morreu ainda são gravados
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._executar, name='escritor', daemon=True)
+                self._thread.start()
+
+    def _proximo_lote(self):
+        lote = [self._fila.get()]
+        # Só espera por mais pedidos se o lote anterior já veio agrupado, isto é, se há
+        # concorrência; um terminal sozinho não paga a espera
+        prazo = time.monotonic() + (self.espera if self._agrupando else 0)
+        while len(lote) < self.maximo_lote:
+            restante = prazo - time.monotonic()
+            try:
+                lote.append(self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait())
+            except queue.Empty:
+                break
+        self._agrupando = len(lote) > 1
+        return lote
+
+    def _executar(self):
+        with self.app.app_context():
+            while True:
+                lote = self._proximo_lote()
+                try:
+                    self._processar(lote)
+                except Exception as erro:
+                    # Falha do próprio banco (rollback, conexão): responde os pedidos e a
+                    # thread segue viva para os próximos lotes
+                    self.app.logger.exception('Erro no escritor de cadastros')
+                    for _, _, futuro in lote:
+                        if not futuro.done():
+                            futuro.set_exception(erro)
+
+    def _processar(self, lote):
+        try:
+            self._gravar_lote(lote)
+        except Exception:
+            # Um registro inválido não derruba os outros: regrava um a um
+            db.session.rollback()
+            for pedido in lote:
+                self._gravar_lote([pedido])
+        finally:
+            db.session.close()
+
+    def _gravar_lote(self, lote):
+        pendentes = [pedido for pedido in lote if not pedido[2].done()]
+        try:
+            objetos = [modelo(**valores) for modelo, valores, _ in pendentes]
+            db.session.add_all(objetos)
+            # Os ids saem do flush; depois do commit ler objeto.id faria um SELECT por objeto
+            db.session.flush()
+            ids = [objeto.id for objeto in objetos]
+            db.session.commit()
+        except Exception as erro:
+            if len(pendentes) > 1:
+                raise
+            db.session.rollback()
+            for _, _, futuro in pendentes:
+                futuro.set_exception(erro)
+            return
+        self.lotes += 1
+        self.gravados += len(pendentes)
+        for (_, _, futuro), identificador in zip(pendentes, ids):
+            futuro.set_result(identificador)
+
+
+def gravar(modelo, **valores):
+    # Pelo escritor do app, se houver; senão grava na própria requisição
+    escritor = current_app.extensions.get('escritor')
+    if escritor is not None:
+        return escritor.gravar(modelo, **valores)
+    objeto = modelo(**valores)
+    db.session.add(objeto)
+    db.session.commit()
+    return objeto.id
+
+
+def instalar(app):
+    # Bancos em memória são um por conexão: a thread do escritor não veria os dados
+    memoria = app.config['SQLALCHEMY_DATABASE_URI'] in ('sqlite://', 'sqlite:///:memory:')
+    if app.config['ESCRITA_AGRUPADA'] and not memoria:
+        app.extensions['escritor'] = Escritor(app)
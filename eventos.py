@@ -0,0 +1,177 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import case, func, select
+
+import resumos
+from models import db, Resumo, dados_alterados, versoes
+
+TABELAS = ('venda', 'gasto')
+# De quanto em quanto tempo a versão dos dados é conferida, para notar gravações feitas
+# por outros processos (workers), que não passam pelo sinal deste
+INTERVALO_VERIFICACAO = 2
+# Comentário enviado quando não há eventos, para proxies não fecharem a conexão
+INTERVALO_PING = 15
+# Cada conexão aberta ocupa uma thread do servidor enquanto durar: ela é encerrada depois
+# disso (segundos) e o navegador reconecta sozinho, para nenhuma thread ficar presa de vez.
+# O número de conexões por processo vem de CONEXOES_EVENTOS.
+DURACAO_CONEXAO = 300
+EVENTOS_POR_ASSINANTE = 100
+# Com mais dias alterados num commit só, o evento pede para recarregar o gráfico
+MAXIMO_DIAS = 31
+
+
+def _soma(condicao, coluna):
+    return func.coalesce(func.sum(case((condicao, coluna), else_=0)), 0)
+
+
+def buckets(tabela, dias):
+    # Valor atual (unidades, total em reais) de cada período que contém os dias alterados,
+    # lido dos resumos: um dia, até 7 dias da semana, o mês e até 12 meses do ano
+    resultado = {'dia': {}, 'semana': {}, 'mes': {}, 'ano': {}}
+    for dia in sorted(dias):
+        segunda = dia - timedelta(days=dia.weekday())
+        chaves = {'dia': dia.isoformat(), 'semana': segunda.isoformat(), 'mes': dia.isoformat()[:7],
+                  'ano': str(dia.year)}
+        condicoes = {
+            'dia': (Resumo.periodo == 'dia') & (Resumo.chave == chaves['dia']),
+            'semana': (Resumo.periodo == 'dia') & Resumo.chave.between(
+                segunda.isoformat(), (segunda + timedelta(days=6)).isoformat()),
+            'mes': (Resumo.periodo == 'mes') & (Resumo.chave == chaves['mes']),
+            'ano': (Resumo.periodo == 'mes') & Resumo.chave.between(f'{dia.year}-01', f'{dia.year}-12'),
+        }
+        colunas = []
+        for condicao in condicoes.values():
+            colunas += [_soma(condicao, Resumo.unidades), _soma(condicao, Resumo.total_centavos)]
+        linha = db.session.execute(
+            select(*colunas).where(Resumo.tabela == tabela, condicoes['semana'] | condicoes['ano'])
+        ).one()
+        for indice, periodo in enumerate(condicoes):
+            resultado[periodo][chaves[periodo]] = [linha[indice * 2], linha[indice * 2 + 1] / 100]
+    return resultado
+
+
+def montar_evento(tabelas, dias):
+    # dias: {tabela: conjunto de datas ou None}; sem os dias, o cliente recarrega o gráfico
+    evento = {'tabelas': sorted(tabelas), 'totais': {}, 'buckets': {}, 'recarregar': False}
+    for tabela in sorted(tabelas):
+        evento['totais'][tabela] = resumos.totais(tabela)
+        alterados = dias.get(tabela)
+        if alterados is None or len(alterados) > MAXIMO_DIAS:
+            evento['recarregar'] = True
+        else:
+            evento['buckets'][tabela] = buckets(tabela, alterados)
+    return evento
+
+
+# Transmissão dos eventos aos dashboards abertos (Server-Sent Events). Uma thread por processo
+# recebe os avisos de commit, monta um evento com uma ou duas consultas aos resumos e o
+# entrega a todas as conexões: o custo não cresce com o número de dashboards abertos.
+class Transmissor:
+    def __init__(self, app, maximo):
+        self.app = app
+        self.maximo = maximo
+        self._assinantes = set()
+        self._avisos = queue.Queue()
+        self._versoes = None
+        self._numero = 0
+        self._thread = None
+        self._pid = None
+        self._trava = threading.Lock()
+
+    def assinar(self):
+        # Fila de eventos já formatados de uma conexão; None se o limite foi atingido
+        with self._trava:
+            if len(self._assinantes) >= self.maximo:
+                return None
+            if self._thread is None or self._pid != os.getpid():
+                self._avisos = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._executar, name='eventos', daemon=True)
+                self._thread.start()
+            fila = queue.Queue(EVENTOS_POR_ASSINANTE)
+            self._assinantes.add(fila)
+            return fila
+
+    def cancelar(self, fila):
+        with self._trava:
+            self._assinantes.discard(fila)
+
+    def avisar(self, tabelas, dias):
+        # Alterações só no catálogo de produtos não mudam os dashboards
+        tabelas = set(tabelas).intersection(TABELAS)
+        if tabelas and self._assinantes:
+            self._avisos.put((tabelas, dias))
+
+    def _publicar(self, evento):
+        self._numero += 1
+        texto = f'id: {self._numero}\nevent: dados\ndata: {json.dumps(evento)}\n\n'
+        with self._trava:
+            assinantes = list(self._assinantes)
+        for fila in assinantes:
+            try:
+                fila.put_nowait(texto)
+            except queue.Full:
+                # Conexão lenta: descarta o atrasado e pede para o cliente recarregar tudo
+                with fila.mutex:
+                    fila.queue.clear()
+                fila.put_nowait(f'event: dados\ndata: {json.dumps({"recarregar": True})}\n\n')
+
+    def _proximo_evento(self, aviso):
+        atuais = dict(zip(TABELAS, versoes(TABELAS)))
+        anteriores, self._versoes = self._versoes, atuais
+        if aviso is not None:
+            return montar_evento(*aviso)
+        if anteriores is None:
+            return None
+        tabelas = {tabela for tabela in TABELAS if atuais[tabela] != anteriores[tabela]}
+        if not tabelas:
+            return None
+        # Gravado por outro processo: os dias alterados não são conhecidos aqui
+        return montar_evento(tabelas, {})
+
+    def _executar(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    aviso = self._avisos.get(timeout=INTERVALO_VERIFICACAO)
+                except queue.Empty:
+                    aviso = None
+                if not self._assinantes:
+                    self._versoes = None
+                    continue
+                try:
+                    evento = self._proximo_evento(aviso)
+                    if evento is not None:
+                        self._publicar(evento)
+                except Exception:
+                    self.app.logger.exception('Erro ao montar evento dos dashboards')
+                finally:
+                    db.session.close()
+
+    def transmitir(self, fila):
+        # Corpo da resposta text/event-stream de uma conexão; a rota cancela a assinatura no close()
+        yield 'retry: 5000\n\n'
+        fim = time.monotonic() + DURACAO_CONEXAO
+        while time.monotonic() < fim:
+            try:
+                yield fila.get(timeout=INTERVALO_PING)
+            except queue.Empty:
+                yield ': ping\n\n'
+
+
+def instalar(app):
+    transmissor = Transmissor(app, app.config['CONEXOES_EVENTOS'])
+    app.extensions['eventos'] = transmissor
+
+    def avisar(sender, tabelas, dias, **extras):
+        # Só commits deste app (pode haver mais de um no processo, como nos benchmarks)
+        if has_app_context() and current_app._get_current_object() is app:
+            transmissor.avisar(tabelas, dias)
+    app.extensions['eventos_receptor'] = avisar
+    dados_alterados.connect(avisar)
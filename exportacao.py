@@ -0,0 +1,124 @@
+import csv
+import io
+import tempfile
+
+from sqlalchemy import select
+
+from models import db, Venda, Gasto
+
+# Colunas no mesmo formato aceito pela importação, para o arquivo poder voltar ao sistema
+COLUNAS = {
+    'vendas': (Venda, ('Data', 'Descrição', 'Unidade', 'Valor Unitário', 'Valor Total'),
+               (Venda.data, Venda.descricao, Venda.unidade, Venda.valor_unitario_centavos,
+                Venda.valor_total_centavos)),
+    'gastos': (Gasto, ('Data', 'Descrição', 'Valor'),
+               (Gasto.data, Gasto.descricao, Gasto.valor_centavos)),
+}
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Linhas lidas do cursor por vez e linhas por pedaço enviado ao navegador
+LINHAS_POR_LOTE = 5000
+# Limite de linhas de uma planilha do Excel, menos o cabeçalho
+LINHAS_POR_PLANILHA = 1048575
+PEDACO_ARQUIVO = 64 * 1024
+
+
+class ExportacaoIndisponivel(RuntimeError):
+    pass
+
+
+def reais(centavos):
+    # Centavos inteiros para texto com vírgula decimal, sem passar por float
+    sinal = '-' if centavos < 0 else ''
+    inteiro, resto = divmod(abs(centavos), 100)
+    return f'{sinal}{inteiro},{resto:02d}'
+
+
+def linha_csv(tipo, linha):
+    if tipo == 'vendas':
+        data, descricao, unidade, unitario, total = linha
+        return data.isoformat(), descricao, unidade, reais(unitario), reais(total)
+    data, descricao, valor = linha
+    return data.isoformat(), descricao, reais(valor)
+
+
+def linha_planilha(tipo, linha):
+    # Na planilha vão números de verdade, em reais, e a data como data
+    if tipo == 'vendas':
+        data, descricao, unidade, unitario, total = linha
+        return data, descricao, unidade, unitario / 100, total / 100
+    data, descricao, valor = linha
+    return data, descricao, valor / 100
+
+
+def linhas(tipo, de=None, ate=None):
+    # Lê em ordem de data pelo índice, em partições de LINHAS_POR_LOTE, sem carregar tudo
+    modelo, _, colunas = COLUNAS[tipo]
+    consulta = select(*colunas).order_by(modelo.data, modelo.id)
+    if de:
+        consulta = consulta.where(modelo.data >= de)
+    if ate:
+        consulta = consulta.where(modelo.data <= ate)
+    resultado = db.session.execute(consulta.execution_options(yield_per=LINHAS_POR_LOTE))
+    for particao in resultado.partitions():
+        yield particao
+
+
+def gerar_csv(tipo, de=None, ate=None):
+    # Cada partição vira um pedaço de texto; com BOM para o Excel reconhecer o UTF-8
+    _, cabecalho, _ = COLUNAS[tipo]
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+    buffer.write('\ufeff')
+    escritor.writerow(cabecalho)
+    for particao in linhas(tipo, de, ate):
+        escritor.writerows(linha_csv(tipo, linha) for linha in particao)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gerar_xlsx(tipo, de=None, ate=None):
+    # O openpyxl em modo write-only grava as linhas em arquivos temporários, com memória
+    # constante, mas o .xlsx (um zip) só fica pronto no final; daí é enviado em pedaços
+    from openpyxl import Workbook
+
+    _, cabecalho, _ = COLUNAS[tipo]
+    livro = Workbook(write_only=True)
+    planilha, ocupadas = None, LINHAS_POR_PLANILHA
+    for particao in linhas(tipo, de, ate):
+        for linha in particao:
+            if ocupadas == LINHAS_POR_PLANILHA:
+                planilha = livro.create_sheet(f'{tipo.capitalize()} {len(livro.worksheets) + 1}')
+                planilha.append(cabecalho)
+                ocupadas = 0
+            planilha.append(linha_planilha(tipo, linha))
+            ocupadas += 1
+    if planilha is None:
+        livro.create_sheet(tipo.capitalize()).append(cabecalho)
+
+    with tempfile.TemporaryFile() as arquivo:
+        livro.save(arquivo)
+        arquivo.seek(0)
+        while pedaco := arquivo.read(PEDACO_ARQUIVO):
+            yield pedaco
+
+
+def exportar(tipo, formato, de=None, ate=None):
+    if formato == 'xlsx':
+        # Verificado antes de começar a resposta, que depois já não pode virar um erro
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise ExportacaoIndisponivel('Instale o pacote openpyxl para exportar planilhas .xlsx')
+        return gerar_xlsx(tipo, de, ate)
+    return gerar_csv(tipo, de, ate)
+
+
+def nome_arquivo(tipo, formato, de=None, ate=None):
+    partes = [tipo] + [data.isoformat() for data in (de, ate) if data]
+    return f"{'_'.join(partes)}.{formato}"
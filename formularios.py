@@ -0,0 +1,38 @@
+from flask_wtf import FlaskForm
+from wtforms import StringField, IntegerField, FloatField, DateField, SubmitField
+from wtforms.validators import DataRequired, NumberRange, Length, Optional, ValidationError
+
+from models import db, Produto
+
+
+# Formulário para Vendas
+class VendaForm(FlaskForm):
+    data = DateField('Data', validators=[DataRequired()])
+    descricao = StringField('Descrição',
+                            validators=[DataRequired(), Length(min=2, max=100)])
+    unidade = IntegerField('Unidade',
+                           validators=[DataRequired(), NumberRange(min=1)])
+    valor_unitario = FloatField('Valor Unitário',
+                                validators=[DataRequired()])
+    # Produto do catálogo escolhido nas sugestões; vazio para vendas digitadas livremente
+    produto_id = IntegerField('Produto', validators=[Optional(), NumberRange(min=1)])
+    submit = SubmitField('Cadastrar Venda')
+
+    def validate_produto_id(self, campo):
+        if campo.data is not None and db.session.get(Produto, campo.data) is None:
+            raise ValidationError('Produto não cadastrado')
+
+
+# Formulário para Gastos
+class GastoForm(FlaskForm):
+    data = DateField('Data', validators=[DataRequired()])
+    descricao = StringField('Descrição', validators=[DataRequired(), Length(min=2, max=100)])
+    valor = FloatField('Valor', validators=[DataRequired()])
+    submit = SubmitField('Cadastrar Gasto')
+
+
+# Formulário para Produtos do catálogo
+class ProdutoForm(FlaskForm):
+    codigo = StringField('Código', validators=[DataRequired(), Length(max=30)])
+    nome = StringField('Nome', validators=[DataRequired(), Length(min=2, max=100)])
+    preco = FloatField('Preço', validators=[Optional(), NumberRange(min=0)])
@@ -0,0 +1,61 @@
+# Figuras dos dashboards. O plotly é importado dentro das funções, no primeiro
+# dashboard aberto, para não pesar na inicialização do app nem no cadastro.
+import agregacao
+from metricas import etapa
+
+CORES = {'receita': '#00b4d8', 'gastos': '#e63946', 'lucro': '#80ed99'}
+
+
+def serie(chave, nome, valores, cor, tipo='barras'):
+    return {'chave': chave, 'nome': nome, 'tipo': tipo, 'cor': cor, 'valores': valores}
+
+
+def compacto(titulo, eixo_x, eixo_y, rotulos, series):
+    # Dados de um gráfico em colunas: rótulos do eixo x e uma lista de valores por série.
+    # No modo cliente é isso que vai para o navegador; no modo servidor vira a figura do plotly.
+    return {'titulo': titulo, 'eixo_x': eixo_x, 'eixo_y': eixo_y, 'rotulos': rotulos, 'series': series}
+
+
+def dados(nome, periodo, de=None, ate=None):
+    eixo_x = agregacao.EIXOS[periodo]
+    if nome == 'lucro':
+        resultado = agregacao.lucro(periodo, de, ate)
+        return compacto(f'Lucro por {eixo_x.lower()}', eixo_x, 'Valor (R$)', resultado['rotulos'], [
+            serie('receita', 'Receita', resultado['receita'], CORES['receita']),
+            serie('gastos', 'Gastos', resultado['gastos'], CORES['gastos']),
+            serie('lucro', 'Lucro', resultado['lucro'], CORES['lucro'], tipo='linha'),
+        ])
+
+    resultado = agregacao.series(periodo, de, ate)
+    if nome == 'vendas':
+        titulo = f'Vendas {agregacao.TITULOS[periodo]}'
+        return compacto(titulo, eixo_x, 'Unidades Vendidas', resultado['rotulos'], [
+            serie('unidades', titulo, resultado['vendas_unidades'], CORES['receita']),
+        ])
+    titulo = f'Gastos {agregacao.TITULOS[periodo]}'
+    return compacto(titulo, eixo_x, 'Valor (R$)', resultado['rotulos'], [
+        serie('total', titulo, resultado['gastos_total'], CORES['gastos']),
+    ])
+
+
+@etapa('plotly')
+def figura(dados):
+    import plotly.graph_objects as go
+
+    tracos = []
+    for serie in dados['series']:
+        if serie['tipo'] == 'linha':
+            tracos.append(go.Scatter(name=serie['nome'], x=dados['rotulos'], y=serie['valores'],
+                                     mode='lines+markers', line_color=serie['cor']))
+        else:
+            tracos.append(go.Bar(name=serie['nome'], x=dados['rotulos'], y=serie['valores'],
+                                 marker_color=serie['cor']))
+    fig = go.Figure(data=tracos)
+    fig.update_layout(
+        title=dados['titulo'],
+        xaxis_title=dados['eixo_x'],
+        yaxis_title=dados['eixo_y'],
+        barmode='group',
+        template='plotly_dark'
+    )
+    return fig.to_json()
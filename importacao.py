@@ -0,0 +1,180 @@
+import csv
+import io
+import re
+import time
+import unicodedata
+import zipfile
+from datetime import date, datetime
+from itertools import chain
+
+from sqlalchemy import insert
+from werkzeug.datastructures import MultiDict
+
+from formularios import VendaForm, GastoForm
+from models import db, Venda, Gasto, centavos, marcar_alteracao
+import resumos
+
+TIPOS = {
+    'vendas': (Venda, VendaForm, ('data', 'descricao', 'unidade', 'valor_unitario', 'produto_id')),
+    'gastos': (Gasto, GastoForm, ('data', 'descricao', 'valor')),
+}
+TAMANHO_LOTE = 5000
+# Quantas linhas rejeitadas detalhar no relatório; as demais são apenas contadas
+MAXIMO_REJEITADAS = 100
+
+DATA_BR = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+
+
+class ArquivoInvalido(ValueError):
+    pass
+
+
+def normalizar_coluna(nome):
+    # 'Valor Unitário' -> 'valor_unitario'
+    nome = unicodedata.normalize('NFKD', str(nome or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'\W+', '_', nome.strip().lower()).strip('_')
+
+
+def normalizar_valor(campo, valor):
+    # Aceita também o formato das planilhas brasileiras: 17/11/2024 e 1.234,56
+    valor = valor.strip()
+    if campo == 'data':
+        encontrado = DATA_BR.match(valor)
+        if encontrado:
+            dia, mes, ano = encontrado.groups()
+            return f'{ano}-{int(mes):02d}-{int(dia):02d}'
+    elif campo != 'descricao' and ',' in valor:
+        return valor.replace('.', '').replace(',', '.')
+    return valor
+
+
+def texto_celula(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)
+
+
+def linhas_csv(arquivo):
+    # Lê o arquivo linha a linha; o separador (';', ',' ou tab) é deduzido do cabeçalho
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    cabecalho = texto.readline()
+    if not cabecalho.strip():
+        raise ArquivoInvalido('Arquivo vazio')
+    separador = max((';', ',', '\t'), key=cabecalho.count)
+    leitor = csv.reader(chain([cabecalho], texto), delimiter=separador)
+    colunas = [normalizar_coluna(coluna) for coluna in next(leitor)]
+    for valores in leitor:
+        if any(valor.strip() for valor in valores):
+            yield dict(zip(colunas, valores))
+
+
+def linhas_xlsx(arquivo):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ArquivoInvalido('Instale o pacote openpyxl para importar planilhas .xlsx')
+    try:
+        livro = load_workbook(arquivo, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        # Não é um .xlsx (outro arquivo renomeado, .xls antigo) ou o pacote está incompleto
+        raise ArquivoInvalido('O arquivo não é uma planilha .xlsx válida')
+    try:
+        linhas = livro.active.iter_rows(values_only=True)
+        colunas = [normalizar_coluna(coluna) for coluna in next(linhas, ())]
+        for valores in linhas:
+            if any(valor is not None for valor in valores):
+                yield {coluna: texto_celula(valor) for coluna, valor in zip(colunas, valores)}
+    finally:
+        livro.close()
+
+
+def ler_linhas(arquivo, nome):
+    if nome.lower().endswith('.xlsx'):
+        return linhas_xlsx(arquivo)
+    return linhas_csv(arquivo)
+
+
+def validar(form, campos, linha):
+    # Mesmas regras do cadastro manual: a linha passa pelo formulário do WTForms,
+    # reaproveitando a mesma instância para não recriar os campos a cada linha
+    dados = MultiDict({campo: normalizar_valor(campo, texto_celula(linha.get(campo)))
+                       for campo in campos})
+    form.process(dados)
+    if not form.validate():
+        return None, [f'{campo}: {", ".join(erros)}' for campo, erros in form.errors.items()]
+    return {campo: getattr(form, campo).data for campo in campos}, None
+
+
+def linha_banco(modelo, registro):
+    # Converte um registro validado (valores em reais) para as colunas da tabela
+    linha = {'data': registro['data'], 'descricao': registro['descricao']}
+    if modelo is Venda:
+        linha['unidade'] = registro['unidade']
+        linha['valor_unitario_centavos'] = centavos(registro['valor_unitario'])
+        linha['valor_total_centavos'] = registro['unidade'] * linha['valor_unitario_centavos']
+        linha['produto_id'] = registro.get('produto_id')
+    else:
+        linha['valor_centavos'] = centavos(registro['valor'])
+    return linha
+
+
+def _valores_resumo(modelo, linha):
+    if modelo is Venda:
+        return resumos.valores_venda(linha['data'], linha['unidade'], linha['valor_unitario_centavos'])
+    return resumos.valores_gasto(linha['data'], linha['valor_centavos'])
+
+
+def gravar(modelo, lote):
+    # Um INSERT executemany por lote, com os resumos atualizados na mesma transação
+    tabela = modelo.__tablename__
+    linhas = [linha_banco(modelo, registro) for registro in lote]
+    db.session.execute(insert(modelo), linhas)
+    resumos.aplicar_lote(db.session.connection(), tabela,
+                         [_valores_resumo(modelo, linha) for linha in linhas])
+    marcar_alteracao(db.session, tabela)
+    db.session.commit()
+    return len(lote)
+
+
+def importar(tipo, linhas, tamanho_lote=TAMANHO_LOTE):
+    modelo, formulario, campos = TIPOS[tipo]
+    form = formulario(formdata=None, meta={'csrf': False})
+    inicio = time.perf_counter()
+    lidas = inseridas = total_rejeitadas = 0
+    rejeitadas = []
+    lote = []
+
+    try:
+        # A linha 1 do arquivo é o cabeçalho
+        for numero, linha in enumerate(linhas, start=2):
+            lidas += 1
+            registro, erros = validar(form, campos, linha)
+            if erros:
+                total_rejeitadas += 1
+                if len(rejeitadas) < MAXIMO_REJEITADAS:
+                    rejeitadas.append({'linha': numero, 'erros': erros})
+                continue
+            lote.append(registro)
+            if len(lote) >= tamanho_lote:
+                inseridas += gravar(modelo, lote)
+                lote = []
+        if lote:
+            inseridas += gravar(modelo, lote)
+    except (UnicodeDecodeError, csv.Error) as erro:
+        db.session.rollback()
+        raise ArquivoInvalido(f'Não foi possível ler o arquivo: {erro}')
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'lidas': lidas,
+        'inseridas': inseridas,
+        'rejeitadas': total_rejeitadas,
+        'detalhes_rejeitadas': rejeitadas,
+        'segundos': round(segundos, 3),
+        'linhas_por_segundo': round(lidas / segundos) if segundos else lidas,
+    }
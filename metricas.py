@@ -0,0 +1,221 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+BALDES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BALDES_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BALDES_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Nome: (tipo, descrição, baldes do histograma)
+METRICAS = {
+    'chaveiro_requisicoes_total': ('counter', 'Requisições atendidas por rota, método e status', None),
+    'chaveiro_requisicao_segundos': ('histogram', 'Latência das requisições por rota', BALDES_SEGUNDOS),
+    'chaveiro_resposta_bytes': ('histogram', 'Tamanho do corpo das respostas por rota', BALDES_BYTES),
+    'chaveiro_consultas_por_requisicao': ('histogram', 'Consultas SQL executadas por requisição', BALDES_CONSULTAS),
+    'chaveiro_sql_segundos': ('histogram', 'Duração das consultas SQL por rota', BALDES_SEGUNDOS),
+    'chaveiro_commit_segundos': ('histogram', 'Duração dos commits (com o flush final) por rota', BALDES_SEGUNDOS),
+    'chaveiro_template_segundos': ('histogram', 'Tempo de renderização por template', BALDES_SEGUNDOS),
+    'chaveiro_etapa_segundos': ('histogram', 'Tempo de etapas internas (agregação, plotly)', BALDES_SEGUNDOS),
+}
+
+# Consultas mais lentas incluídas no log de uma requisição lenta
+CONSULTAS_NO_LOG = 3
+
+
+class Histograma:
+    def __init__(self, baldes):
+        self.baldes = baldes
+        self.contagens = [0] * (len(baldes) + 1)
+        self.soma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.baldes, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+# Métricas em memória, por processo, no formato de texto do Prometheus
+class Registro:
+    def __init__(self, metricas):
+        self.metricas = metricas
+        self._series = {nome: {} for nome in metricas}
+        self._trava = threading.Lock()
+
+    def observar(self, nome, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._trava:
+            series = self._series[nome]
+            if chave not in series:
+                series[chave] = Histograma(self.metricas[nome][2])
+            series[chave].observar(valor)
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._trava:
+            series = self._series[nome]
+            series[chave] = series.get(chave, 0) + valor
+
+    def exportar(self):
+        linhas = []
+        with self._trava:
+            for nome, (tipo, ajuda, baldes) in self.metricas.items():
+                linhas.append(f'# HELP {nome} {ajuda}')
+                linhas.append(f'# TYPE {nome} {tipo}')
+                for chave, valor in sorted(self._series[nome].items()):
+                    if tipo == 'counter':
+                        linhas.append(f'{nome}{_rotulos(chave)} {valor}')
+                        continue
+                    acumulado = 0
+                    for limite, contagem in zip((*baldes, '+Inf'), valor.contagens):
+                        acumulado += contagem
+                        linhas.append(f'{nome}_bucket{_rotulos(chave, le=limite)} {acumulado}')
+                    linhas.append(f'{nome}_sum{_rotulos(chave)} {valor.soma}')
+                    linhas.append(f'{nome}_count{_rotulos(chave)} {valor.total}')
+        return '\n'.join(linhas) + '\n'
+
+
+def _rotulos(chave, **extras):
+    pares = [*chave, *extras.items()]
+    if not pares:
+        return ''
+    texto = ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares)
+    return '{' + texto + '}'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registro = Registro(METRICAS)
+
+
+def _rota():
+    # Usa a regra ('/importar/<tipo>') e não a URL, para não criar uma série por parâmetro
+    if not has_request_context():
+        return '-'
+    return request.url_rule.rule if request.url_rule else 'sem_rota'
+
+
+def _rastro():
+    if has_request_context():
+        return g.get('_metricas')
+    return None
+
+
+@contextmanager
+def etapa(nome):
+    # Mede um trecho do código; aparece no /metrics e no log de requisições lentas
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        registro.observar('chaveiro_etapa_segundos', duracao, etapa=nome)
+        rastro = _rastro()
+        if rastro is not None:
+            rastro['etapas'].append((nome, duracao))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_consulta(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._inicio_metricas = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_inicio_metricas', None)
+    if inicio is None:
+        return
+    duracao = time.perf_counter() - inicio
+    registro.observar('chaveiro_sql_segundos', duracao, rota=_rota())
+    rastro = _rastro()
+    if rastro is not None:
+        rastro['consultas'].append((duracao, statement))
+
+
+# insert=True: roda antes do listener de models, para o flush final entrar na medição
+@event.listens_for(Session, 'before_commit', insert=True)
+def _antes_commit(session):
+    session.info['inicio_commit'] = time.perf_counter()
+
+
+@event.listens_for(Session, 'after_commit')
+def _depois_commit(session):
+    inicio = session.info.pop('inicio_commit', None)
+    if inicio is not None:
+        registro.observar('chaveiro_commit_segundos', time.perf_counter() - inicio, rota=_rota())
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_commit(session):
+    session.info.pop('inicio_commit', None)
+
+
+def _antes_template(sender, template, context, **extra):
+    rastro = _rastro()
+    if rastro is not None:
+        rastro['inicio_template'] = time.perf_counter()
+
+
+def _template_renderizado(sender, template, context, **extra):
+    rastro = _rastro()
+    if rastro is not None and 'inicio_template' in rastro:
+        duracao = time.perf_counter() - rastro.pop('inicio_template')
+        registro.observar('chaveiro_template_segundos', duracao, template=template.name)
+        rastro['etapas'].append((f'template {template.name}', duracao))
+
+
+def _iniciar_requisicao():
+    g._metricas = {'inicio': time.perf_counter(), 'consultas': [], 'etapas': []}
+
+
+def _finalizar_requisicao(resposta):
+    rastro = g.pop('_metricas', None)
+    if rastro is None:
+        return resposta
+    duracao = time.perf_counter() - rastro['inicio']
+    rota = _rota()
+    registro.incrementar('chaveiro_requisicoes_total', rota=rota, metodo=request.method,
+                         status=resposta.status_code)
+    registro.observar('chaveiro_requisicao_segundos', duracao, rota=rota)
+    registro.observar('chaveiro_consultas_por_requisicao', len(rastro['consultas']), rota=rota)
+    # Respostas em streaming só têm tamanho conhecido se vierem com Content-Length
+    tamanho = resposta.content_length if resposta.is_streamed else resposta.calculate_content_length()
+    if tamanho is not None:
+        registro.observar('chaveiro_resposta_bytes', tamanho, rota=rota)
+
+    limite = current_app.config['LIMITE_REQUISICAO_LENTA_MS']
+    if limite is not None and duracao * 1000 >= limite:
+        _registrar_lenta(rota, duracao, rastro)
+    return resposta
+
+
+def _registrar_lenta(rota, duracao, rastro):
+    consultas = rastro['consultas']
+    tempo_sql = sum(tempo for tempo, _ in consultas)
+    linhas = [f'Requisição lenta: {request.method} {request.full_path.rstrip("?")} ({rota}) '
+              f'{duracao * 1000:.1f} ms, {len(consultas)} consultas SQL em {tempo_sql * 1000:.1f} ms']
+    for nome, tempo in rastro['etapas']:
+        linhas.append(f'  {nome}: {tempo * 1000:.1f} ms')
+    for tempo, comando in sorted(consultas, reverse=True)[:CONSULTAS_NO_LOG]:
+        linhas.append(f'  sql {tempo * 1000:.1f} ms: {" ".join(comando.split())[:200]}')
+    current_app.logger.warning('\n'.join(linhas))
+
+
+def instalar(app):
+    # Limite em ms para registrar no log o rastro de uma requisição; None desliga
+    limite = os.environ.get('CHAVEIRO_LENTA_MS')
+    app.config.setdefault('LIMITE_REQUISICAO_LENTA_MS', float(limite) if limite else None)
+    app.before_request(_iniciar_requisicao)
+    app.after_request(_finalizar_requisicao)
+    before_render_template.connect(_antes_template, app)
+    template_rendered.connect(_template_renderizado, app)
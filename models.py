@@ -0,0 +1,267 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+from blinker import Namespace
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+# Inicialização do banco de dados
+db = SQLAlchemy()
+
+# Sinal emitido depois de cada commit que alterou vendas, gastos ou produtos, com as tabelas e
+# os dias alterados de cada uma (None quando a escrita foi em lote ou a tabela não tem datas).
+# O sinal guarda só referências fracas aos receptores: quem conecta uma função criada na hora
+# precisa guardá-la em app.extensions, senão ela é coletada e deixa de ser chamada.
+sinais = Namespace()
+dados_alterados = sinais.signal('dados-alterados')
+
+
+def centavos(valor):
+    # Converte reais (float, Decimal ou texto) para centavos inteiros, arredondando 0,5 para cima
+    return int((Decimal(str(valor)) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+# Catálogo de produtos, para as vendas serem agrupadas pelo produto e não pelo texto digitado
+class Produto(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(30), nullable=False, unique=True)
+    nome = db.Column(db.String(100), nullable=False)
+    preco_centavos = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def preco(self):
+        return self.preco_centavos / 100
+
+    @preco.setter
+    def preco(self, valor):
+        self.preco_centavos = centavos(valor)
+
+    def como_dict(self):
+        return {'id': self.id, 'codigo': self.codigo, 'nome': self.nome, 'preco': self.preco}
+
+
+# Modelo para vendas
+class Venda(db.Model):
+    # Índices de cobertura: os totais por período e por produto são lidos sem tocar na tabela.
+    # O de descrição (NOCASE, como o LIKE do SQLite) atende o filtro por prefixo das listagens.
+    __table_args__ = (
+        db.Index('ix_venda_data_total', 'data', 'unidade', 'valor_total_centavos'),
+        db.Index('ix_venda_produto', 'produto_id', 'data', 'unidade', 'valor_total_centavos'),
+        db.Index('ix_venda_descricao', text('descricao COLLATE NOCASE')),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Date, nullable=False)
+    descricao = db.Column(db.String(100), nullable=False)
+    unidade = db.Column(db.Integer, nullable=False)
+    valor_unitario_centavos = db.Column(db.Integer, nullable=False)
+    valor_total_centavos = db.Column(db.Integer, nullable=False)
+    # Opcional: vendas antigas e as digitadas fora do catálogo ficam sem produto
+    produto_id = db.Column(db.Integer, db.ForeignKey('produto.id'))
+
+    @property
+    def valor_unitario(self):
+        return self.valor_unitario_centavos / 100
+
+    @valor_unitario.setter
+    def valor_unitario(self, valor):
+        self.valor_unitario_centavos = centavos(valor)
+
+    @property
+    def valor_total(self):
+        return self.valor_total_centavos / 100
+
+    def como_dict(self):
+        return {
+            'id': self.id,
+            'data': self.data.isoformat(),
+            'descricao': self.descricao,
+            'unidade': self.unidade,
+            'valor_unitario': self.valor_unitario,
+            'valor_total': self.valor_total,
+            'produto_id': self.produto_id,
+        }
+
+
+@event.listens_for(Venda, 'before_insert')
+@event.listens_for(Venda, 'before_update')
+def _calcular_total(mapper, connection, venda):
+    venda.valor_total_centavos = venda.unidade * venda.valor_unitario_centavos
+
+
+# Modelo para gastos
+class Gasto(db.Model):
+    __table_args__ = (
+        db.Index('ix_gasto_data_valor', 'data', 'valor_centavos'),
+        db.Index('ix_gasto_descricao', text('descricao COLLATE NOCASE')),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Date, nullable=False)
+    descricao = db.Column(db.String(100), nullable=False)
+    valor_centavos = db.Column(db.Integer, nullable=False)
+
+    @property
+    def valor(self):
+        return self.valor_centavos / 100
+
+    @valor.setter
+    def valor(self, valor):
+        self.valor_centavos = centavos(valor)
+
+    def como_dict(self):
+        return {
+            'id': self.id,
+            'data': self.data.isoformat(),
+            'descricao': self.descricao,
+            'valor': self.valor,
+        }
+
+
+# Totais pré-agregados por dia ('AAAA-MM-DD') e por mês ('AAAA-MM') de cada tabela
+class Resumo(db.Model):
+    tabela = db.Column(db.String(10), primary_key=True)
+    periodo = db.Column(db.String(3), primary_key=True)
+    chave = db.Column(db.String(10), primary_key=True)
+    registros = db.Column(db.Integer, nullable=False, default=0)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    total_centavos = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def total(self):
+        return self.total_centavos / 100
+
+
+# Chaves de idempotência geradas no navegador, para não gravar duas vezes o mesmo lançamento
+class ChaveSincronizacao(db.Model):
+    chave = db.Column(db.String(64), primary_key=True)
+    tabela = db.Column(db.String(10), nullable=False)
+    registro_id = db.Column(db.Integer, nullable=False)
+
+
+# Tarefas pesadas (exportações, relatórios, reconstruções) executadas fora das requisições
+# pelas threads de tarefas.py; o resultado fica num arquivo em PASTA_TAREFAS
+class Tarefa(db.Model):
+    __table_args__ = (
+        # No máximo uma tarefa igual pendente ou em execução, mesmo com vários processos
+        db.Index('ix_tarefa_em_andamento', 'chave', unique=True,
+                 sqlite_where=db.text("estado IN ('pendente', 'executando')")),
+        db.Index('ix_tarefa_estado', 'estado', 'criada_em'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)
+    parametros = db.Column(db.Text, nullable=False)
+    # Hash do tipo, dos parâmetros e (quando o resultado depende deles) da versão dos dados
+    chave = db.Column(db.String(40), nullable=False)
+    estado = db.Column(db.String(10), nullable=False, default='pendente')
+    criada_em = db.Column(db.DateTime, nullable=False)
+    iniciada_em = db.Column(db.DateTime)
+    # pid do processo que executa a tarefa (o banco é um arquivo local: todos estão na mesma máquina)
+    processo = db.Column(db.Integer)
+    concluida_em = db.Column(db.DateTime)
+    erro = db.Column(db.Text)
+    mimetype = db.Column(db.String(100))
+    nome_arquivo = db.Column(db.String(100))
+
+    def como_dict(self):
+        def momento(valor):
+            return valor.replace(tzinfo=timezone.utc).isoformat() if valor else None
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'parametros': json.loads(self.parametros),
+            'estado': self.estado,
+            'criada_em': momento(self.criada_em),
+            'iniciada_em': momento(self.iniciada_em),
+            'concluida_em': momento(self.concluida_em),
+            'erro': self.erro,
+        }
+
+
+# Versão dos dados de cada tabela, incrementada no mesmo commit que altera a tabela.
+# Fica no banco para que todos os processos (workers) enxerguem a mesma versão.
+class VersaoDados(db.Model):
+    tabela = db.Column(db.String(10), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    # Momento (UTC) do commit que gerou a versão; vira o Last-Modified das respostas
+    alterado_em = db.Column(db.DateTime)
+
+
+TABELAS_MONITORADAS = ('venda', 'gasto', 'produto')
+# Tabelas de lançamentos, cujos dias alterados também são registrados
+TABELAS_LANCAMENTOS = ('venda', 'gasto')
+
+_INSERIR_VERSAO = insert(VersaoDados)
+_INCREMENTAR_VERSAO = _INSERIR_VERSAO.on_conflict_do_update(
+    index_elements=['tabela'],
+    set_={'versao': VersaoDados.versao + 1, 'alterado_em': _INSERIR_VERSAO.excluded.alterado_em}
+)
+
+
+def marcar_alteracao(session, tabela):
+    # Para escritas em lote (Core) que não passam pelo flush do ORM; os dias alterados
+    # ficam desconhecidos (None)
+    session.info.setdefault('tabelas_alteradas', set()).add(tabela)
+    session.info.setdefault('dias_alterados', {})[tabela] = None
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_alteracoes(session, flush_context, instances):
+    alteradas = session.info.setdefault('tabelas_alteradas', set())
+    dias = session.info.setdefault('dias_alterados', {})
+    for objeto in (*session.new, *session.dirty, *session.deleted):
+        tabela = getattr(objeto, '__tablename__', None)
+        if tabela in TABELAS_MONITORADAS:
+            alteradas.add(tabela)
+            if tabela not in TABELAS_LANCAMENTOS or (tabela in dias and dias[tabela] is None):
+                continue
+            # O dia do registro e, se a data mudou, o dia anterior
+            dias.setdefault(tabela, set()).update((objeto.data, *inspect(objeto).attrs.data.history.deleted))
+
+
+def versoes(tabelas):
+    # Versão atual de cada tabela; 0 para tabelas ainda não alteradas
+    return estado(tabelas)[0]
+
+
+def estado(tabelas):
+    # Versões e momento da última alteração entre as tabelas (None se nunca alteradas
+    # ou se alguma foi alterada antes de o momento passar a ser gravado)
+    lidas = {tabela: (versao, alterado_em) for tabela, versao, alterado_em in db.session.execute(
+        select(VersaoDados.tabela, VersaoDados.versao, VersaoDados.alterado_em)
+        .where(VersaoDados.tabela.in_(tabelas))
+    )}
+    versoes_lidas = tuple(lidas.get(tabela, (0, None))[0] for tabela in tabelas)
+    momentos = [alterado_em for _, alterado_em in lidas.values()]
+    if not momentos or None in momentos:
+        return versoes_lidas, None
+    return versoes_lidas, max(momentos).replace(tzinfo=timezone.utc)
+
+
+@event.listens_for(Session, 'before_commit')
+def _incrementar_versoes(session):
+    # O flush final do commit ainda não aconteceu; antecipa para conhecer todas as tabelas
+    session.flush()
+    alteradas = session.info.get('tabelas_alteradas')
+    if alteradas:
+        agora = datetime.now(timezone.utc).replace(tzinfo=None)
+        session.execute(_INCREMENTAR_VERSAO, [{'tabela': tabela, 'versao': 1, 'alterado_em': agora}
+                                              for tabela in sorted(alteradas)])
+
+
+@event.listens_for(Session, 'after_commit')
+def _notificar_alteracoes(session):
+    alteradas = session.info.pop('tabelas_alteradas', None)
+    dias = session.info.pop('dias_alterados', {})
+    if alteradas:
+        dados_alterados.send(session, tabelas=alteradas, dias={tabela: dias.get(tabela) for tabela in alteradas})
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes(session):
+    session.info.pop('tabelas_alteradas', None)
+    session.info.pop('dias_alterados', None)
@@ -0,0 +1,108 @@
+import string
+from datetime import date
+
+from sqlalchemy import func, select, tuple_
+
+from models import db
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 500
+# Com pelo menos tantas descrições começando pelo prefixo, a listagem percorre as linhas pela
+# data em vez de pelo índice de descrição
+PREFIXO_FREQUENTE = 1000
+MINUSCULAS_ASCII = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def ler_data(valor, campo):
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise ParametroInvalido(f"'{campo}' deve estar no formato AAAA-MM-DD")
+
+
+def ler_cursor(valor):
+    # Cursor opaco no formato 'AAAA-MM-DD_id', apontando para o último item entregue
+    if not valor:
+        return None
+    data, _, identificador = valor.partition('_')
+    try:
+        return ler_data(data, 'cursor'), int(identificador)
+    except ValueError:
+        raise ParametroInvalido('cursor inválido')
+
+
+def ler_limite(valor):
+    if not valor:
+        return LIMITE_PADRAO
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ParametroInvalido("'limite' deve ser um número inteiro")
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _faixa_prefixo(coluna, prefixo):
+    # descricao LIKE 'ab%' vira a faixa 'ab' <= descricao < 'ac' no índice NOCASE. Só as letras
+    # ASCII são trocadas, como no NOCASE; a faixa pode sobrar um pouco, e o LIKE confere o resto.
+    coluna = coluna.collate('NOCASE')
+    condicao = coluna >= prefixo
+    fim = prefixo.translate(MINUSCULAS_ASCII)
+    if ord(fim[-1]) < 0x10FFFF:
+        condicao &= coluna < fim[:-1] + chr(ord(fim[-1]) + 1)
+    return condicao
+
+
+def _prefixo_frequente(modelo, faixa):
+    consulta = select(modelo.id).where(faixa).limit(PREFIXO_FREQUENTE).subquery()
+    return db.session.scalar(select(func.count()).select_from(consulta)) >= PREFIXO_FREQUENTE
+
+
+def listar(modelo, limite=LIMITE_PADRAO, cursor=None, de=None, ate=None, prefixo=None):
+    # Paginação por chave (data, id), do mais recente para o mais antigo:
+    # o custo depende do tamanho da página, não da posição nem do total de linhas
+    consulta = select(modelo).order_by(modelo.data.desc(), modelo.id.desc())
+    if cursor:
+        consulta = consulta.where(tuple_(modelo.data, modelo.id) < tuple_(*cursor))
+    if de:
+        consulta = consulta.where(modelo.data >= de)
+    if ate:
+        consulta = consulta.where(modelo.data <= ate)
+    if prefixo:
+        semelhante = modelo.descricao.like(escapar_like(prefixo) + '%', escape='\\')
+        faixa = _faixa_prefixo(modelo.descricao, prefixo)
+        if _prefixo_frequente(modelo, faixa):
+            # Prefixo comum ('c'): as linhas na ordem da data acham a página logo; likely() impede
+            # o SQLite de trocar isso pela faixa do índice, que ordenaria milhares de linhas
+            consulta = consulta.where(func.likely(semelhante))
+        else:
+            consulta = consulta.where(faixa, semelhante)
+
+    itens = db.session.scalars(consulta.limit(limite + 1)).all()
+    proximo = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        proximo = f'{itens[-1].data}_{itens[-1].id}'
+    return itens, proximo
+
+
+def pagina(modelo, argumentos):
+    # Lê os parâmetros da query string e devolve a página pronta para JSON
+    itens, proximo = listar(
+        modelo,
+        limite=ler_limite(argumentos.get('limite')),
+        cursor=ler_cursor(argumentos.get('cursor')),
+        de=ler_data(argumentos.get('de'), 'de'),
+        ate=ler_data(argumentos.get('ate'), 'ate'),
+        prefixo=argumentos.get('descricao'),
+    )
+    return {'itens': [item.como_dict() for item in itens], 'proximo': proximo}
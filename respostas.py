@@ -0,0 +1,100 @@
+import functools
+import gzip
+import hashlib
+import os
+from datetime import date, datetime, time, timezone
+
+from flask import Response, current_app, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+from models import estado
+
+# Tipos comprimidos com gzip; o bundle do plotly e as exportações já têm o próprio caminho
+TIPOS_COMPRIMIVEIS = ('text/html', 'text/plain', 'text/css', 'text/csv', 'application/json',
+                      'application/javascript')
+# Abaixo disso o cabeçalho do gzip não compensa
+TAMANHO_MINIMO_COMPRESSAO = 500
+NIVEL_COMPRESSAO = 6
+
+
+def etag(*partes):
+    return hashlib.sha1(repr(partes).encode()).hexdigest()[:20]
+
+
+def versao_templates(app, nomes):
+    # Hash do código dos templates (e do modo padrão dos gráficos, que muda o HTML) e a
+    # data do mais recente: um deploy com templates novos invalida as páginas em cache
+    resumo = hashlib.sha1(app.config['MODO_GRAFICOS'].encode())
+    alterado_em = None
+    for nome in nomes:
+        fonte, arquivo, _ = app.jinja_loader.get_source(app.jinja_env, nome)
+        resumo.update(fonte.encode())
+        momento = datetime.fromtimestamp(int(os.path.getmtime(arquivo)), timezone.utc)
+        alterado_em = max(alterado_em or momento, momento)
+    return resumo.hexdigest()[:12], alterado_em
+
+
+def condicional(*tabelas, templates=False, diario=False):
+    # GET condicional: o ETag sai da URL, da versão dos dados das tabelas e, conforme o caso,
+    # da versão dos templates e da data de hoje. Com If-None-Match/If-Modified-Since em dia,
+    # responde 304 sem executar a view (uma consulta à versao_dados e nada mais).
+    def decorador(view):
+        @functools.wraps(view)
+        def envolvida(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            versoes, alterado_em = estado(tabelas)
+            # Mensagens flash pendentes também mudam a página gerada
+            partes = [request.full_path, versoes, session.get('_flashes')]
+            momentos = [alterado_em]
+            if templates:
+                versao, templates_em = current_app.config['VERSAO_TEMPLATES']
+                partes.append(versao)
+                momentos.append(templates_em)
+            if diario:
+                # Totais do dia mudam à meia-noite mesmo sem gravações
+                hoje = date.today()
+                partes.append(hoje)
+                momentos.append(datetime.combine(hoje, time()).astimezone(timezone.utc))
+            ultima = None if None in momentos else max(momentos)
+
+            marca = etag(*partes)
+            if is_resource_modified(request.environ, etag=marca, last_modified=ultima):
+                resposta = make_response(view(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+            else:
+                resposta = Response(status=304)
+            # Fraco: a mesma marca vale para a versão comprimida e a original
+            resposta.set_etag(marca, weak=True)
+            if ultima is not None:
+                resposta.last_modified = ultima
+            resposta.cache_control.no_cache = True
+            return resposta
+        return envolvida
+    return decorador
+
+
+def comprimir(resposta):
+    # gzip nas respostas montadas em memória; respostas em streaming (exportações) e
+    # arquivos (send_file, já pré-comprimidos) passam direto
+    if (resposta.status_code != 200 or resposta.is_streamed or resposta.direct_passthrough
+            or 'Content-Encoding' in resposta.headers
+            or resposta.mimetype not in TIPOS_COMPRIMIVEIS):
+        return resposta
+    resposta.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return resposta
+    corpo = resposta.get_data()
+    if len(corpo) < TAMANHO_MINIMO_COMPRESSAO:
+        return resposta
+    resposta.set_data(gzip.compress(corpo, NIVEL_COMPRESSAO, mtime=0))
+    resposta.headers['Content-Encoding'] = 'gzip'
+    return resposta
+
+
+def instalar(app, templates):
+    app.config['VERSAO_TEMPLATES'] = versao_templates(app, templates)
+    # Registrado depois das métricas, roda antes delas: o tamanho medido é o comprimido
+    app.after_request(comprimir)
@@ -0,0 +1,182 @@
+from datetime import date
+
+from sqlalchemy import case, event, func, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm.attributes import get_history
+
+from models import db, Venda, Gasto, Resumo, marcar_alteracao
+
+PERIODOS = {'dia': 10, 'mes': 7}
+
+
+# Valores em centavos: (data, unidades, total)
+def valores_venda(data, unidade, valor_unitario_centavos):
+    return data, unidade, unidade * valor_unitario_centavos
+
+
+def valores_gasto(data, valor_centavos):
+    return data, 0, valor_centavos
+
+
+def _comando_upsert():
+    comando = insert(Resumo)
+    return comando.on_conflict_do_update(
+        index_elements=['tabela', 'periodo', 'chave'],
+        set_={
+            'registros': Resumo.registros + comando.excluded.registros,
+            'unidades': Resumo.unidades + comando.excluded.unidades,
+            'total_centavos': Resumo.total_centavos + comando.excluded.total_centavos,
+        }
+    )
+
+
+# Montado uma vez e executado com parâmetros, inclusive em executemany
+UPSERT = _comando_upsert()
+
+
+def _parametros(tabela, data, registros, unidades, total):
+    # str() de um date já é 'AAAA-MM-DD'
+    dia = str(data)
+    return [
+        {'tabela': tabela, 'periodo': periodo, 'chave': dia[:tamanho],
+         'registros': registros, 'unidades': unidades, 'total_centavos': total}
+        for periodo, tamanho in PERIODOS.items()
+    ]
+
+
+def aplicar(connection, tabela, data, registros, unidades, total):
+    # Soma (ou subtrai, com sinais negativos) um lançamento nos resumos de dia e mês
+    connection.execute(UPSERT, _parametros(tabela, data, registros, unidades, total))
+    # Remove buckets que ficaram vazios depois de exclusões
+    if registros < 0:
+        connection.execute(
+            Resumo.__table__.delete().where(
+                Resumo.tabela == tabela,
+                Resumo.chave.in_([str(data)[:tamanho] for tamanho in PERIODOS.values()]),
+                Resumo.registros <= 0
+            )
+        )
+
+
+def aplicar_lote(connection, tabela, linhas):
+    # Agrupa um lote inserido em massa por dia antes de atualizar os resumos
+    por_dia = {}
+    for data, unidades, total in linhas:
+        acumulado = por_dia.setdefault(data, [0, 0, 0])
+        acumulado[0] += 1
+        acumulado[1] += unidades
+        acumulado[2] += total
+    parametros = []
+    for data, (registros, unidades, total) in por_dia.items():
+        parametros.extend(_parametros(tabela, data, registros, unidades, total))
+    if parametros:
+        connection.execute(UPSERT, parametros)
+
+
+def _valores(alvo, anteriores=False):
+    def valor(campo):
+        if anteriores:
+            historico = get_history(alvo, campo)
+            if historico.deleted:
+                return historico.deleted[0]
+        return getattr(alvo, campo)
+
+    if isinstance(alvo, Venda):
+        return valores_venda(valor('data'), valor('unidade'), valor('valor_unitario_centavos'))
+    return valores_gasto(valor('data'), valor('valor_centavos'))
+
+
+def _ao_inserir(mapper, connection, alvo):
+    data, unidades, total = _valores(alvo)
+    aplicar(connection, mapper.local_table.name, data, 1, unidades, total)
+
+
+def _ao_excluir(mapper, connection, alvo):
+    data, unidades, total = _valores(alvo, anteriores=True)
+    aplicar(connection, mapper.local_table.name, data, -1, -unidades, -total)
+
+
+def _ao_atualizar(mapper, connection, alvo):
+    antigos = _valores(alvo, anteriores=True)
+    novos = _valores(alvo)
+    if antigos == novos:
+        return
+    data, unidades, total = antigos
+    aplicar(connection, mapper.local_table.name, data, -1, -unidades, -total)
+    data, unidades, total = novos
+    aplicar(connection, mapper.local_table.name, data, 1, unidades, total)
+
+
+for _modelo in (Venda, Gasto):
+    event.listen(_modelo, 'after_insert', _ao_inserir)
+    event.listen(_modelo, 'after_delete', _ao_excluir)
+    event.listen(_modelo, 'after_update', _ao_atualizar)
+
+
+def _consulta_agregada(tabela, periodo):
+    tamanho = PERIODOS[periodo]
+    if tabela == 'venda':
+        chave = func.substr(Venda.data, 1, tamanho)
+        unidades = func.sum(Venda.unidade)
+        total = func.sum(Venda.valor_total_centavos)
+    else:
+        chave = func.substr(Gasto.data, 1, tamanho)
+        unidades = literal(0)
+        total = func.sum(Gasto.valor_centavos)
+    return select(
+        literal(tabela), literal(periodo), chave,
+        func.count(), unidades, total
+    ).group_by(chave)
+
+
+def reconstruir():
+    # Recalcula todos os resumos a partir das tabelas de origem, direto no SQL
+    consultas = [
+        _consulta_agregada(tabela, periodo)
+        for tabela in ('venda', 'gasto')
+        for periodo in PERIODOS
+    ]
+    colunas = ['tabela', 'periodo', 'chave', 'registros', 'unidades', 'total_centavos']
+    db.session.execute(Resumo.__table__.delete())
+    db.session.execute(
+        Resumo.__table__.insert().from_select(colunas, union_all(*consultas))
+    )
+    # Os totais mudaram sem escrita em venda/gasto: avança as versões para os caches, ETags e
+    # dashboards ao vivo (que recebem recarregar) não seguirem com os números antigos
+    marcar_alteracao(db.session, 'venda')
+    marcar_alteracao(db.session, 'gasto')
+    db.session.commit()
+    return db.session.scalar(select(func.count()).select_from(Resumo))
+
+
+def garantir_resumos():
+    # Preenche os resumos de bancos criados antes dessa tabela existir
+    if db.session.scalar(select(Resumo.chave).limit(1)) is not None:
+        return
+    if (db.session.scalar(select(Venda.id).limit(1)) is not None
+            or db.session.scalar(select(Gasto.id).limit(1)) is not None):
+        reconstruir()
+
+
+def totais(tabela, hoje=None):
+    # Totais de dia, mês e ano lidos dos resumos: um dia e até 12 meses, seja qual for o volume
+    hoje = hoje or date.today()
+    dia = hoje.isoformat()
+    mes = dia[:7]
+    linha = db.session.execute(
+        select(
+            func.sum(case((Resumo.periodo == 'dia', Resumo.total_centavos), else_=0)),
+            func.sum(case(((Resumo.periodo == 'mes') & (Resumo.chave == mes), Resumo.total_centavos),
+                          else_=0)),
+            func.sum(case((Resumo.periodo == 'mes', Resumo.total_centavos), else_=0)),
+        ).where(
+            Resumo.tabela == tabela,
+            ((Resumo.periodo == 'dia') & (Resumo.chave == dia))
+            | ((Resumo.periodo == 'mes') & Resumo.chave.between(f'{hoje.year}-01', f'{hoje.year}-12'))
+        )
+    ).one()
+    return {
+        'total_dia': (linha[0] or 0) / 100,
+        'total_mes': (linha[1] or 0) / 100,
+        'total_ano': (linha[2] or 0) / 100,
+    }
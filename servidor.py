@@ -0,0 +1,94 @@
+import argparse
+import os
+import threading
+import webbrowser
+
+from app import create_app
+from models import db
+
+
+def abrir_navegador(url):
+    webbrowser.open_new(url)
+
+
+def configuracao(threads):
+    # Cada dashboard ao vivo prende uma thread; a outra metade fica para as demais requisições
+    return {'CONEXOES_EVENTOS': threads // 2}
+
+
+def exigir_chave_secreta():
+    # A chave padrão do app.py é pública; exposta na rede, qualquer um forja sessões e tokens CSRF
+    if not os.environ.get('CHAVEIRO_SECRET_KEY'):
+        raise SystemExit('Defina CHAVEIRO_SECRET_KEY (um valor aleatório, por exemplo '
+                         '"python -c \'import secrets; print(secrets.token_hex())\'") para o modo produção.')
+
+
+def servir_waitress(app, host, porta, threads):
+    try:
+        from waitress import serve
+    except ImportError:
+        # Sem waitress, usa o servidor do Werkzeug com threads (sem debug nem reloader)
+        app.run(host=host, port=porta, threaded=True, debug=False, use_reloader=False)
+        return
+    serve(app, host=host, port=porta, threads=threads)
+
+
+def servir_gunicorn(host, porta, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class Aplicacao(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{porta}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread' if threads > 1 else 'sync')
+
+        def load(self):
+            # Cada worker cria o próprio app e o próprio pool de conexões
+            return create_app(configuracao(threads))
+
+    Aplicacao().run()
+
+
+def desktop(host, porta, threads):
+    # Uso no balcão: um processo só e o navegador aberto na página de cadastro
+    app = create_app(configuracao(threads))
+    threading.Timer(1.5, abrir_navegador, [f'http://{host}:{porta}']).start()
+    servir_waitress(app, host, porta, threads)
+
+
+def producao(host, porta, workers, threads):
+    exigir_chave_secreta()
+    # Prepara o banco (migrações, resumos) uma vez, antes de criar os workers
+    app = create_app(configuracao(threads))
+    if workers > 1:
+        if os.name != 'posix':
+            raise SystemExit('Vários workers exigem gunicorn (Linux/macOS); use --workers 1 com mais threads.')
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            raise SystemExit('Instale o gunicorn para usar mais de um worker.')
+        with app.app_context():
+            db.engine.dispose()
+        servir_gunicorn(host, porta, workers, threads)
+    else:
+        servir_waitress(app, host, porta, threads)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description='Servidor do Chaveiro Willian Mix')
+    parser.add_argument('--modo', choices=('desktop', 'producao'), default='producao')
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--porta', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('CHAVEIRO_WORKERS', 2)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('CHAVEIRO_THREADS', 8)))
+    opcoes = parser.parse_args(argumentos)
+
+    if opcoes.modo == 'desktop':
+        desktop(opcoes.host or '127.0.0.1', opcoes.porta or 5000, opcoes.threads)
+    else:
+        producao(opcoes.host or '0.0.0.0', opcoes.porta or 8000, opcoes.workers, opcoes.threads)
+
+
+if __name__ == '__main__':
+    main()
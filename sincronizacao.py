@@ -0,0 +1,61 @@
+from sqlalchemy import select
+
+from models import db, ChaveSincronizacao
+from importacao import TIPOS, validar
+
+MAXIMO_ITENS = 500
+# Tamanho da coluna chave_sincronizacao.chave; chaves maiores são recusadas, não cortadas
+TAMANHO_CHAVE = 64
+
+
+class LoteInvalido(ValueError):
+    pass
+
+
+def sincronizar(lote):
+    # Grava numa única transação os lançamentos enfileirados no navegador.
+    # Chaves já conhecidas são confirmadas sem gravar de novo, então o cliente
+    # pode reenviar o mesmo lote quantas vezes precisar.
+    if not isinstance(lote, dict):
+        raise LoteInvalido('Envie um objeto JSON com as listas vendas e gastos')
+    if any(not isinstance(lote.get(tipo) or [], list) for tipo in TIPOS):
+        raise LoteInvalido('vendas e gastos devem ser listas')
+    itens = [(tipo, item) for tipo in TIPOS for item in lote.get(tipo) or []]
+    if len(itens) > MAXIMO_ITENS:
+        raise LoteInvalido(f'Envie no máximo {MAXIMO_ITENS} lançamentos por vez')
+    if any(not isinstance(item, dict) or not item.get('chave') for _, item in itens):
+        raise LoteInvalido("Todo lançamento precisa de uma 'chave'")
+    # Cortar a chave juntaria lançamentos diferentes: o segundo seria confirmado sem ser gravado
+    if any(not isinstance(item['chave'], str) or len(item['chave']) > TAMANHO_CHAVE for _, item in itens):
+        raise LoteInvalido(f"A 'chave' deve ser um texto de até {TAMANHO_CHAVE} caracteres")
+
+    chaves = {item['chave'] for _, item in itens}
+    conhecidas = set(db.session.scalars(
+        select(ChaveSincronizacao.chave).where(ChaveSincronizacao.chave.in_(chaves))
+    ))
+
+    formularios = {tipo: formulario(formdata=None, meta={'csrf': False})
+                   for tipo, (_, formulario, _) in TIPOS.items()}
+    confirmadas, rejeitadas, novos = [], [], []
+    for tipo, item in itens:
+        chave = item['chave']
+        if chave in conhecidas:
+            confirmadas.append(chave)
+            continue
+        modelo, _, campos = TIPOS[tipo]
+        registro, erros = validar(formularios[tipo], campos, item)
+        if erros:
+            rejeitadas.append({'chave': chave, 'erros': erros})
+            continue
+        conhecidas.add(chave)
+        novos.append((chave, modelo(**registro)))
+
+    db.session.add_all(objeto for _, objeto in novos)
+    db.session.flush()
+    db.session.add_all(
+        ChaveSincronizacao(chave=chave, tabela=objeto.__tablename__, registro_id=objeto.id)
+        for chave, objeto in novos
+    )
+    db.session.commit()
+    confirmadas.extend(chave for chave, _ in novos)
+    return {'confirmadas': list(dict.fromkeys(confirmadas)), 'rejeitadas': rejeitadas, 'gravadas': len(novos)}
@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.exc import IntegrityError
+
+import agregacao
+import colunar
+import exportacao
+import graficos
+import resumos
+from models import db, Tarefa, versoes
+from paginacao import ParametroInvalido
+
+EM_ANDAMENTO = ('pendente', 'executando')
+GRAFICOS = ('vendas', 'gastos', 'lucro')
+# Sem aviso de uma tarefa nova neste processo, a fila é conferida nesse intervalo (segundos),
+# para pegar as criadas por outros processos
+INTERVALO_VERIFICACAO = 2
+# Uma tarefa em execução há mais tempo que isso é dada como perdida, mesmo com o processo vivo
+PRAZO_EXECUCAO = timedelta(hours=1)
+# Tarefas terminadas (e seus arquivos) são apagadas depois disso
+RETENCAO = timedelta(days=1)
+INTERVALO_LIMPEZA = 600
+
+# Pega a tarefa pendente mais antiga, se o total em execução (em todos os processos) ainda
+# estiver abaixo do limite. Um UPDATE só: o SQLite o executa com a trava de escrita, então
+# dois processos nunca pegam a mesma tarefa nem passam juntos do limite.
+_PEGAR = text(
+    "UPDATE tarefa SET estado = 'executando', iniciada_em = :agora, processo = :processo "
+    "WHERE id = (SELECT id FROM tarefa WHERE estado = 'pendente' ORDER BY criada_em LIMIT 1) "
+    "AND (SELECT count(*) FROM tarefa WHERE estado = 'executando') < :maximo "
+    "RETURNING id"
+)
+
+
+def _agora():
+    # UTC sem fuso, como os demais momentos gravados no banco
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _intervalo(parametros):
+    de, ate = agregacao.ler_intervalo(parametros)
+    return {'de': de and de.isoformat(), 'ate': ate and ate.isoformat()}
+
+
+def _ler_exportacao(parametros):
+    if parametros.get('tipo') not in exportacao.COLUNAS:
+        raise ParametroInvalido("'tipo' deve ser vendas ou gastos")
+    formato = parametros.get('formato') or 'csv'
+    if formato not in exportacao.FORMATOS:
+        raise ParametroInvalido("'formato' deve ser csv ou xlsx")
+    return {'tipo': parametros['tipo'], 'formato': formato, **_intervalo(parametros)}
+
+
+def _exportar(parametros, caminho):
+    tipo, formato = parametros['tipo'], parametros['formato']
+    de, ate = agregacao.ler_intervalo(parametros)
+    with open(caminho, 'wb') as saida:
+        for pedaco in exportacao.exportar(tipo, formato, de, ate):
+            saida.write(pedaco)
+    return exportacao.FORMATOS[formato], exportacao.nome_arquivo(tipo, formato, de, ate)
+
+
+def _ler_grafico(parametros):
+    if parametros.get('nome') not in GRAFICOS:
+        raise ParametroInvalido("'nome' deve ser vendas, gastos ou lucro")
+    periodo = agregacao.ler_periodo(parametros.get('periodo'))
+    return {'nome': parametros['nome'], 'periodo': periodo, **_intervalo(parametros)}
+
+
+def _grafico(parametros, caminho):
+    # Dados compactos do gráfico (o mesmo JSON de /api/grafico), por exemplo de todo o histórico
+    de, ate = agregacao.ler_intervalo(parametros)
+    dados = graficos.dados(parametros['nome'], parametros['periodo'], de, ate)
+    with open(caminho, 'w', encoding='utf-8') as saida:
+        json.dump(dados, saida)
+    return 'application/json', f"grafico_{parametros['nome']}_{parametros['periodo']}.json"
+
+
+def _sem_parametros(parametros):
+    return {}
+
+
+def _reconstruir_resumos(parametros, caminho):
+    with open(caminho, 'w', encoding='utf-8') as saida:
+        json.dump({'resumos': resumos.reconstruir()}, saida)
+    return 'application/json', 'resumos.json'
+
+
+def _atualizar_colunar(parametros, caminho):
+    relatorio = colunar.atualizar(current_app.config['PASTA_COLUNAR'])
+    with open(caminho, 'w', encoding='utf-8') as saida:
+        json.dump(relatorio, saida)
+    return 'application/json', 'colunar.json'
+
+
+def _tabelas_exportacao(parametros):
+    return (exportacao.COLUNAS[parametros['tipo']][0].__tablename__,)
+
+
+def _tabelas_grafico(parametros):
+    return ('venda', 'gasto')
+
+
+# Tipo -> (valida e normaliza os parâmetros, executa gravando o resultado no caminho dado e
+# devolvendo (mimetype, nome do arquivo), tabelas de que o resultado depende). Com tabelas,
+# um resultado pronto com a mesma versão dos dados é reaproveitado; sem, toda tarefa nova roda.
+TIPOS = {
+    'exportacao': (_ler_exportacao, _exportar, _tabelas_exportacao),
+    'grafico': (_ler_grafico, _grafico, _tabelas_grafico),
+    'resumos': (_sem_parametros, _reconstruir_resumos, None),
+    'colunar': (_sem_parametros, _atualizar_colunar, None),
+}
+
+
+def _vivo_windows(processo):
+    # os.kill(pid, 0) no Windows encerra o processo; consulta o código de saída pela API
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    alca = kernel32.OpenProcess(0x1000, False, processo)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not alca:
+        # Acesso negado: o processo existe, mas é de outro usuário
+        return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED
+    try:
+        codigo = ctypes.c_ulong()
+        return bool(kernel32.GetExitCodeProcess(alca, ctypes.byref(codigo))) and codigo.value == 259  # STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(alca)
+
+
+def _vivo(processo):
+    if processo == os.getpid():
+        return True
+    if not isinstance(processo, int) or processo <= 0:
+        # Pid desconhecido (tarefa de antes da coluna processo): sem como conferir, conta como perdida
+        return False
+    if os.name != 'posix':
+        return _vivo_windows(processo)
+    try:
+        os.kill(processo, 0)
+    except PermissionError:
+        # O processo existe, mas é de outro usuário
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def caminho(tarefa_id):
+    return os.path.join(current_app.config['PASTA_TAREFAS'], tarefa_id)
+
+
+def _existente(chave, reaproveitar):
+    estados = EM_ANDAMENTO + ('concluida',) if reaproveitar else EM_ANDAMENTO
+    for tarefa in db.session.scalars(
+            select(Tarefa).where(Tarefa.chave == chave, Tarefa.estado.in_(estados))
+            .order_by(Tarefa.criada_em.desc())):
+        # O arquivo de uma tarefa concluída pode já ter sido apagado pela limpeza
+        if tarefa.estado != 'concluida' or os.path.exists(caminho(tarefa.id)):
+            return tarefa
+    return None
+
+
+def criar(tipo, parametros):
+    # Devolve (tarefa, criada): uma tarefa igual em andamento (ou já pronta, com os mesmos
+    # dados) é devolvida em vez de criar outra
+    if tipo not in TIPOS:
+        raise ParametroInvalido(f"'tipo' deve ser um de: {', '.join(TIPOS)}")
+    if parametros is not None and not isinstance(parametros, dict):
+        raise ParametroInvalido("'parametros' deve ser um objeto JSON")
+    ler, _, tabelas = TIPOS[tipo]
+    parametros = ler({chave: str(valor) for chave, valor in (parametros or {}).items() if valor is not None})
+    partes = [tipo, parametros]
+    if tabelas:
+        partes.append(versoes(tabelas(parametros)))
+    chave = hashlib.sha1(json.dumps(partes, sort_keys=True).encode()).hexdigest()
+
+    for _ in range(3):
+        tarefa = _existente(chave, reaproveitar=bool(tabelas))
+        if tarefa is not None:
+            return tarefa, False
+        tarefa = Tarefa(id=uuid.uuid4().hex, tipo=tipo, parametros=json.dumps(parametros), chave=chave,
+                        estado='pendente', criada_em=_agora())
+        db.session.add(tarefa)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Outro processo criou a mesma tarefa ao mesmo tempo; devolve a dele
+            db.session.rollback()
+            continue
+        current_app.extensions['tarefas'].acordar()
+        return tarefa, True
+    raise RuntimeError('Não foi possível registrar a tarefa')
+
+
+# Executor de tarefas por processo: threads que pegam as tarefas pendentes da tabela
+# tarefa e gravam o resultado em arquivo. O limite de tarefas simultâneas vale para todos
+# os processos juntos (ver _PEGAR), então os relatórios nunca ocupam mais que
+# TAREFAS_SIMULTANEAS núcleos e os cadastros seguem respondendo no mesmo tempo.
+class Executor:
+    def __init__(self, app, maximo):
+        self.app = app
+        self.maximo = maximo
+        self._aviso = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._limpeza = 0
+        self._trava = threading.Lock()
+
+    def _iniciar(self):
+        # Threads não sobrevivem ao fork dos workers; cada processo cria as suas
+        with self._trava:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._aviso = threading.Event()
+            self._threads = [threading.Thread(target=self._executar, name=f'tarefas-{numero}', daemon=True)
+                             for numero in range(self.maximo)]
+            for thread in self._threads:
+                thread.start()
+
+    def acordar(self):
+        self._iniciar()
+        self._aviso.set()
+
+    def _recuperar(self):
+        # Tarefas de processos encerrados no meio da execução (reinício, deploy) ainda contam
+        # no limite de simultâneas; são marcadas como falhas para liberar a fila
+        agora = _agora()
+        perdidas = [tarefa_id for tarefa_id, processo, iniciada_em in db.session.execute(
+            select(Tarefa.id, Tarefa.processo, Tarefa.iniciada_em).where(Tarefa.estado == 'executando'))
+            if not _vivo(processo) or iniciada_em < agora - PRAZO_EXECUCAO]
+        if perdidas:
+            db.session.execute(update(Tarefa).where(Tarefa.id.in_(perdidas), Tarefa.estado == 'executando').values(
+                estado='falhou', concluida_em=agora, erro='Interrompida (o processo foi encerrado)'))
+            db.session.commit()
+            self.app.logger.warning('%d tarefas interrompidas marcadas como falhas', len(perdidas))
+
+    def _limpar(self):
+        agora = _agora()
+        antigas = list(db.session.scalars(select(Tarefa.id).where(
+            Tarefa.estado.not_in(EM_ANDAMENTO), Tarefa.concluida_em < agora - RETENCAO)))
+        if antigas:
+            db.session.execute(delete(Tarefa).where(Tarefa.id.in_(antigas)))
+        db.session.commit()
+        for tarefa_id in antigas:
+            if os.path.exists(caminho(tarefa_id)):
+                os.remove(caminho(tarefa_id))
+
+    def _pegar(self):
+        tarefa_id = db.session.execute(
+            _PEGAR, {'agora': _agora(), 'maximo': self.maximo, 'processo': os.getpid()}).scalar()
+        db.session.commit()
+        return tarefa_id
+
+    def _rodar(self, tarefa_id):
+        tarefa = db.session.get(Tarefa, tarefa_id)
+        tipo, parametros = tarefa.tipo, json.loads(tarefa.parametros)
+        destino = caminho(tarefa_id)
+        try:
+            mimetype, nome_arquivo = TIPOS[tipo][1](parametros, destino)
+        except Exception as erro:
+            db.session.rollback()
+            self.app.logger.exception('Erro na tarefa %s (%s)', tarefa_id, tipo)
+            if os.path.exists(destino):
+                os.remove(destino)
+            valores = {'estado': 'falhou', 'erro': str(erro) or erro.__class__.__name__}
+        else:
+            valores = {'estado': 'concluida', 'mimetype': mimetype, 'nome_arquivo': nome_arquivo}
+        # Só se ainda estiver em execução: uma tarefa que passou do prazo já foi dada como falha
+        # por _recuperar (e pode ter sido pedida de novo), e não volta a contar como concluída
+        gravada = db.session.execute(update(Tarefa).where(Tarefa.id == tarefa_id, Tarefa.estado == 'executando')
+                                     .values(concluida_em=_agora(), **valores)).rowcount
+        db.session.commit()
+        if not gravada and os.path.exists(destino):
+            os.remove(destino)
+
+    def _executar(self):
+        with self.app.app_context():
+            while True:
+                self._aviso.wait(INTERVALO_VERIFICACAO)
+                self._aviso.clear()
+                try:
+                    # Dentro do try: sem permissão na pasta a thread registra o erro e tenta de novo
+                    os.makedirs(self.app.config['PASTA_TAREFAS'], exist_ok=True)
+                    if time.monotonic() - self._limpeza > INTERVALO_LIMPEZA:
+                        self._limpeza = time.monotonic()
+                        self._limpar()
+                    self._recuperar()
+                    while (tarefa_id := self._pegar()) is not None:
+                        self._rodar(tarefa_id)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Erro no executor de tarefas')
+                finally:
+                    db.session.close()
+
+
+def instalar(app):
+    app.extensions['tarefas'] = Executor(app, app.config['TAREFAS_SIMULTANEAS'])
@@ -0,0 +1,9 @@
+# Ponto de entrada WSGI para servidores de produção:
+#   gunicorn --workers 4 --threads 8 wsgi:app
+#   waitress-serve --threads 8 wsgi:app
+# Cada dashboard ao vivo ocupa uma thread: ajuste CHAVEIRO_CONEXOES_EVENTOS às threads (0 com um worker sync)
+from app import create_app
+from servidor import exigir_chave_secreta
+
+exigir_chave_secreta()
+app = create_app()